@@ -7,7 +7,6 @@ from scheduling.utils import (
     get_machine_pool,
     get_machine_calendar,
 )
-import json
 
 st.session_state["st_report_end"] = 5
 
@@ -117,8 +116,8 @@ with st.container():
             ),
             value=(0, 2),
         )
-        table = st.session_state["machine_calendar"].get_report_data(end_day, start_day)
-        st.session_state["utilization_report"] = json.loads(table.get_json_string())[1:]
+        report = st.session_state["machine_calendar"].get_report(end_day, start_day)
+        st.session_state["utilization_report"] = list(report.iter_rows())
         if st.session_state.get("utilization_report"):
             st.table(st.session_state["utilization_report"])
 
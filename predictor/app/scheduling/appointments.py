@@ -1,19 +1,244 @@
-from typing import Type
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
-from scheduling.patients import Patient
-from scheduling.calendar import Day
+from scheduling.locks import LockState
 from scheduling.machines import BaseMachine
+from scheduling.patients import Patient
+
+
+class AppointmentNotFound(Exception):
+    def __init__(self, appointment_id: int):
+        super().__init__(f"Appointment {appointment_id} not found")
 
 
 class Appointment:
+    """Course of treatment booked on one machine for ``days`` days in a row.
+
+    ``start_day`` is a calendar day, it doesn't change when the calendar
+    advances.
+    """
+
+    __slots__ = (
+        "appointment_id",
+        "patient_name",
+        "cancer_name",
+        "machine",
+        "start_day",
+        "days",
+        "allocated_time_minutes",
+        "start_minute",
+    )
+
+    def __str__(self):
+        return (
+            f"{self.__class__.__name__}(appointment_id={self.appointment_id}, "
+            f"machine={self.machine.name()}, start_day={self.start_day}, "
+            f"days={self.days})"
+        )
+
+    def __repr__(self):
+        return self.__str__()
+
     def __init__(
         self,
+        appointment_id: int,
         allocated_time_minutes: int,
         patient: Patient,
-        machine: Type[BaseMachine],
-        day: Day,
+        machine: BaseMachine,
+        start_day: int,
+        days: int,
+        start_minute: Optional[int] = None,
     ):
-        self.patient = patient
+        self.appointment_id = appointment_id
+        self.patient_name = patient.name
+        self.cancer_name = patient.cancer.name()
         self.machine = machine
+        self.start_day = start_day
+        self.days = days
         self.allocated_time_minutes = allocated_time_minutes
-        self.day = day
+        # minute of the day every fraction starts at, slotted calendars only
+        self.start_minute = start_minute
+
+    @property
+    def end_day(self) -> int:
+        return self.start_day + self.days
+
+    def to_dict(self):
+        return {
+            "appointment_id": self.appointment_id,
+            "patient_name": self.patient_name,
+            "cancer_type": self.cancer_name,
+            "machine_name": self.machine.name(),
+            "start_day": self.start_day,
+            "days": self.days,
+            "treatment_time_minutes": self.allocated_time_minutes,
+            "start_minute": self.start_minute,
+        }
+
+
+class AppointmentLedger(LockState):
+    """In-memory record of every booked appointment.
+
+    Indexed by id, by patient name and, per machine, by start day. Courses
+    are never longer than the longest one seen, so a day range lookup only
+    bisects the start days that can still overlap it.
+
+    Changes are serialized, lookups take no lock and skip appointments
+    removed while they run.
+    """
+
+    def __str__(self):
+        return f"{self.__class__.__name__}(appointments={len(self)})"
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __init__(self):
+        self._appointments: Dict[int, Appointment] = {}
+        self._by_patient: Dict[str, Set[int]] = {}
+        self._by_machine: Dict[str, List[Tuple[int, int]]] = {}
+        self._max_days = 0
+        self._next_id = 1
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._appointments)
+
+    def __iter__(self):
+        return iter(list(self._appointments.values()))
+
+    def add(
+        self,
+        patient: Patient,
+        machine: BaseMachine,
+        start_day: int,
+        days: int,
+        allocated_time_minutes: int,
+        start_minute: Optional[int] = None,
+    ) -> Appointment:
+        with self.lock:
+            appointment = Appointment(
+                self._next_id,
+                allocated_time_minutes,
+                patient,
+                machine,
+                start_day,
+                days,
+                start_minute,
+            )
+            self._next_id += 1
+
+            self._appointments[appointment.appointment_id] = appointment
+            self._by_patient.setdefault(appointment.patient_name, set()).add(
+                appointment.appointment_id
+            )
+            insort(
+                self._by_machine.setdefault(machine.name(), []),
+                (start_day, appointment.appointment_id),
+            )
+            self._max_days = max(self._max_days, days)
+            return appointment
+
+    def get(self, appointment_id: int) -> Appointment:
+        try:
+            return self._appointments[appointment_id]
+        except KeyError:
+            raise AppointmentNotFound(appointment_id)
+
+    def remove(self, appointment_id: int) -> Appointment:
+        with self.lock:
+            appointment = self.get(appointment_id)
+            del self._appointments[appointment_id]
+
+            patient_ids = self._by_patient[appointment.patient_name]
+            patient_ids.discard(appointment_id)
+            if not patient_ids:
+                del self._by_patient[appointment.patient_name]
+
+            machine_index = self._by_machine[appointment.machine.name()]
+            del machine_index[
+                bisect_left(machine_index, (appointment.start_day, appointment_id))
+            ]
+            return appointment
+
+    def move(
+        self,
+        appointment_id: int,
+        machine: BaseMachine,
+        start_day: int,
+        start_minute: Optional[int] = None,
+    ) -> Appointment:
+        with self.lock:
+            appointment = self.get(appointment_id)
+
+            machine_index = self._by_machine[appointment.machine.name()]
+            del machine_index[
+                bisect_left(machine_index, (appointment.start_day, appointment_id))
+            ]
+            insort(
+                self._by_machine.setdefault(machine.name(), []),
+                (start_day, appointment_id),
+            )
+
+            appointment.machine = machine
+            appointment.start_day = start_day
+            appointment.start_minute = start_minute
+            return appointment
+
+    def _lookup(self, appointment_ids: Iterable[int]) -> Iterator[Appointment]:
+        for appointment_id in appointment_ids:
+            appointment = self._appointments.get(appointment_id)
+            if appointment is not None:
+                yield appointment
+
+    def by_patient(self, patient_name: str) -> List[Appointment]:
+        return sorted(
+            self._lookup(tuple(self._by_patient.get(patient_name, ()))),
+            key=lambda appointment: (appointment.start_day, appointment.appointment_id),
+        )
+
+    def by_machine(
+        self,
+        machine_name: str,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+    ) -> List[Appointment]:
+        """Appointments on a machine running on any day of [start, end)."""
+        machine_index = self._by_machine.get(machine_name, [])
+        low = 0
+        if start is not None:
+            low = bisect_left(machine_index, (start - self._max_days + 1, 0))
+        high = len(machine_index)
+        if end is not None:
+            high = bisect_left(machine_index, (end, 0))
+
+        appointments = self._lookup(i for _, i in machine_index[low:high])
+        if start is None:
+            return list(appointments)
+        return [appointment for appointment in appointments if appointment.end_day > start]
+
+    def find(
+        self,
+        patient_name: Optional[str] = None,
+        machine_name: Optional[str] = None,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+    ) -> List[Appointment]:
+        if patient_name is not None:
+            return [
+                appointment
+                for appointment in self.by_patient(patient_name)
+                if (machine_name is None or appointment.machine.name() == machine_name)
+                and (start is None or appointment.end_day > start)
+                and (end is None or appointment.start_day < end)
+            ]
+
+        machine_names = [machine_name] if machine_name else sorted(self._by_machine)
+        appointments = []
+        for name in machine_names:
+            appointments.extend(self.by_machine(name, start, end))
+        return sorted(
+            appointments,
+            key=lambda appointment: (appointment.start_day, appointment.appointment_id),
+        )
@@ -4,6 +4,18 @@ from scheduling.diseases import Cancer
 
 
 class AllocatableEntity:
+    # Bumped on every allocation, maintenance or pool change, lets cached
+    # views over the machines know when to rebuild.
+    _state_version = 0
+
+    @staticmethod
+    def state_changed():
+        AllocatableEntity._state_version += 1
+
+    @staticmethod
+    def state_version() -> int:
+        return AllocatableEntity._state_version
+
     def name(self):
         raise NotImplementedError
 
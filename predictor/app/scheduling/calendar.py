@@ -1,13 +1,31 @@
 import copy
-from typing import List, Optional, TYPE_CHECKING
+import threading
+from collections.abc import Sequence
+from typing import List, Optional, Tuple, TYPE_CHECKING
 
 import numpy as np
-from prettytable import PrettyTable
+from numpy.lib.stride_tricks import sliding_window_view
 
-from scheduling.constants import YEAR_LEN_DAYS
+from scheduling.appointments import Appointment, AppointmentLedger
+from scheduling.capacity_index import CapacityIndex
+from scheduling.locks import LockState, SharedLock
+from scheduling.slots import SlotError, SlotIndex
+from scheduling.constants import (
+    YEAR_LEN_DAYS,
+    DAY_LENGTH_MINUTES,
+    LOAD_RESOLUTIONS,
+    RESOLUTION_DAY,
+)
 
 if TYPE_CHECKING:
+    from prettytable import PrettyTable
+
+    from scheduling.reservation import CapacityReservation
+    from scheduling.storage import CalendarFile
+    from scheduling.wal import AllocationLog
+
     from scheduling.machine_pool import MachinePool
+    from scheduling.patients import Patient
 
 from scheduling.machines import BaseMachine
 
@@ -22,48 +40,101 @@ class NotEnoughDaysError(Exception):
         super().__init__("Not enough days to allocate")
 
 
+class InvalidDayError(Exception):
+    def __init__(self, day: int, current_day: int):
+        super().__init__(f"Can't move calendar from day {current_day} to day {day}")
+
+
+class AppointmentStartedError(Exception):
+    def __init__(self, appointment_id: int):
+        super().__init__(f"Appointment {appointment_id} has already started")
+
+
+class UnknownMachineError(Exception):
+    def __init__(self, machine_name: str):
+        super().__init__(f"Unknown machine {machine_name}")
+
+
+class InvalidResolutionError(Exception):
+    def __init__(self, resolution: str):
+        super().__init__(
+            f"Resolution {resolution} is invalid. "
+            f"Available resolutions: [ {', '.join(LOAD_RESOLUTIONS)} ]"
+        )
+
+
 class Day:
+    """Thin view over a single day of a ``Period``.
+
+    Days are created on access, the minutes themselves live in the
+    period's array.
+    """
+
+    __slots__ = ("_period", "_index")
+
     def __str__(self):
         return f"{self.__class__.__name__}(time_left={self.time_left()})"
 
     def __repr__(self):
         return self.__str__()
 
-    def __init__(self):
-        self._day_length_minutes = 8 * 60
-        self._time_limit_minutes = copy.copy(self._day_length_minutes)
-
-        self.appointments: List[str] = []
+    def __init__(self, period: "Period", index: int):
+        self._period = period
+        self._index = index
 
     def time_left(self):
-        return self._time_limit_minutes
+        return self._period.time_left(self._index)
 
     def is_busy(self):
-        return self.time_left() < self._day_length_minutes // 2
+        return self.time_left() < self._period.day_length_minutes // 2
 
     def load_level(self) -> float:
-        return self.time_left() / self._day_length_minutes
+        return self.time_left() / self._period.day_length_minutes
 
     def can_allocate(self, minutes_to_allocate: int):
         return self.time_left() >= minutes_to_allocate
 
     def allocate(self, minutes_to_allocate: int):
-        if (self._time_limit_minutes - minutes_to_allocate) >= 0:
-            self._time_limit_minutes -= minutes_to_allocate
-        else:
-            raise AllocationError(minutes_to_allocate)
-
+        self._period.allocate(1, minutes_to_allocate, self._index)
         return self.time_left()
 
     def release(self, minutes_to_release: int):
-        if (self._time_limit_minutes + minutes_to_release) >= self._day_length_minutes:
-            self._time_limit_minutes = self._day_length_minutes
-        else:
-            self._time_limit_minutes += minutes_to_release
+        self._period.release(1, minutes_to_release, self._index)
         return self.time_left()
 
 
-class Period:
+class Days(Sequence):
+    """Sequence of ``Day`` views over a period."""
+
+    __slots__ = ("_period",)
+
+    def __init__(self, period: "Period"):
+        self._period = period
+
+    def __len__(self):
+        return self._period.period_length_days
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [Day(self._period, i) for i in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError(item)
+        return Day(self._period, item)
+
+
+class Period(LockState):
+    """Remaining minutes of a machine, one array cell per day.
+
+    The array is a ring buffer: ``advance`` retires elapsed days and reuses
+    their cells as new empty days at the far end, so day 0 is always the
+    current day and nothing else moves.
+
+    A slotted period also keeps the booked minute intervals of every day,
+    so courses get a start minute that is the same on all of their days.
+    """
+
     def __str__(self):
         return (
             f"{self.__class__.__name__}(period_length_days={self.period_length_days})"
@@ -72,31 +143,213 @@ class Period:
     def __repr__(self):
         return self.__str__()
 
-    def __init__(self, period_length_days: int = 365):
+    def __init__(
+        self,
+        period_length_days: int = 365,
+        day_length_minutes: int = DAY_LENGTH_MINUTES,
+        indexed: bool = False,
+        slotted: bool = False,
+    ):
         self.period_length_days = period_length_days
-        self.days = [Day() for _ in range(self.period_length_days)]
+        self.day_length_minutes = day_length_minutes
+        self._time_left = np.full(
+            period_length_days, day_length_minutes, dtype=np.int32
+        )
+        # cell of day 0
+        self._origin = 0
+        self._index = CapacityIndex(self._time_left) if indexed else None
+        # days retired so far, slots are keyed by day_offset + shift
+        self.day_offset = 0
+        self.slots = SlotIndex(day_length_minutes) if slotted else None
+        # longest free run of every day, a cheap filter before the slot search
+        self._largest_gap = (
+            np.full(period_length_days, day_length_minutes, dtype=np.int32)
+            if slotted
+            else None
+        )
+
+        # running aggregates, kept up to date by allocations and releases
+        self._free_minutes_total = period_length_days * day_length_minutes
+        self._busy_days = 0
+        # bumped on every change of the minutes
+        self.version = 0
+        # held by every change, a check and its allocation happen under it
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        # copies of a file-backed period keep their minutes in memory
+        state["_time_left"] = np.array(self._time_left)
+        return state
+
+    @property
+    def indexed(self) -> bool:
+        return self._index is not None
+
+    @property
+    def origin(self) -> int:
+        """Array cell of day 0."""
+        return self._origin
+
+    @property
+    def slotted(self) -> bool:
+        return self.slots is not None
+
+    @property
+    def days(self) -> Days:
+        return Days(self)
+
+    def _segments(self, shift: int, days: int) -> List[Tuple[int, int]]:
+        """Array ranges holding days [shift, shift + days), at most two."""
+        start = self._origin + shift
+        if start >= self.period_length_days:
+            start -= self.period_length_days
+        stop = start + days
+        if stop <= self.period_length_days:
+            return [(start, stop)]
+        return [(start, self.period_length_days), (0, stop - self.period_length_days)]
+
+    def _cell(self, day: int) -> int:
+        return (self._origin + day) % self.period_length_days
+
+    def _read(self, values: np.ndarray, start: int, stop: Optional[int]) -> np.ndarray:
+        stop = self.period_length_days if stop is None else stop
+        segments = self._segments(start, max(stop - start, 0))
+        if len(segments) == 1:
+            (segment_start, segment_stop), = segments
+            return values[segment_start:segment_stop]
+        return np.concatenate([values[a:b] for a, b in segments])
+
+    def time_left(self, day: int) -> int:
+        return int(self._time_left[self._cell(day)])
+
+    def free_minutes(self, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """Minutes left for days [start, stop) of the period, in day order.
+
+        A view of the storage unless the range wraps around the ring.
+        """
+        return self._read(self._time_left, start, stop)
+
+    def largest_gaps(self, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """Longest free run of days [start, stop), slotted periods only."""
+        return self._read(self._largest_gap, start, stop)
+
+    @property
+    def free_minutes_total(self) -> int:
+        return self._free_minutes_total
+
+    @property
+    def busy_days(self) -> int:
+        return self._busy_days
+
+    def _count_busy(self, window: np.ndarray) -> int:
+        return int(np.count_nonzero(window < self.day_length_minutes // 2))
 
     def is_busy(self):
-        return sum([day.is_busy() for day in self.days]) > self.period_length_days // 2
+        return self._busy_days > self.period_length_days // 2
 
     def load_level(self):
-        return sum([day.load_level() for day in self.days]) / self.period_length_days
+        return (
+            self._free_minutes_total
+            / self.day_length_minutes
+            / self.period_length_days
+        )
 
     def _can_allocate_row(
         self, minutes_to_allocate: int, days_to_allocate: int, shift: int = 0
     ):
-        return all(
-            day.can_allocate(minutes_to_allocate)
-            for day in self.days[shift : shift + days_to_allocate]
-        )
+        for start, stop in self._segments(shift, days_to_allocate):
+            if self._index is not None:
+                if self._index.first_below(start, stop, minutes_to_allocate) != -1:
+                    return False
+            elif not (self._time_left[start:stop] >= minutes_to_allocate).all():
+                return False
+        return True
 
     def _allocate_row(
         self, minutes_to_allocate: int, days_to_allocate: int, shift: int = 0
     ):
-        for day in self.days[shift : shift + days_to_allocate]:
-            day.allocate(minutes_to_allocate)
+        for start, stop in self._segments(shift, days_to_allocate):
+            window = self._time_left[start:stop]
+            busy_before = self._count_busy(window)
+            window -= minutes_to_allocate
+            self._busy_days += self._count_busy(window) - busy_before
+            self._free_minutes_total -= minutes_to_allocate * len(window)
+
+            if self._index is not None:
+                self._index.add(start, stop, -minutes_to_allocate)
+        self.version += 1
         return self
 
+    def _release_row(
+        self, minutes_to_release: int, days_to_release: int, shift: int = 0
+    ):
+        for start, stop in self._segments(shift, days_to_release):
+            window = self._time_left[start:stop]
+            busy_before = self._count_busy(window)
+            clamped = bool(
+                (window + minutes_to_release > self.day_length_minutes).any()
+            )
+            if clamped:
+                free_before = int(window.sum())
+                np.minimum(
+                    window + minutes_to_release, self.day_length_minutes, out=window
+                )
+                self._free_minutes_total += int(window.sum()) - free_before
+            else:
+                window += minutes_to_release
+                self._free_minutes_total += minutes_to_release * len(window)
+            self._busy_days += self._count_busy(window) - busy_before
+
+            if self._index is not None:
+                if clamped:
+                    for position, time_left in enumerate(window, start=start):
+                        self._index.set(position, time_left)
+                else:
+                    self._index.add(start, stop, minutes_to_release)
+        self.version += 1
+        return self
+
+    def _last_blocking_day(self, shift: int, days: int, minutes: int) -> int:
+        """Last day of [shift, shift + days) with less than ``minutes`` or -1."""
+        for start, stop in reversed(self._segments(shift, days)):
+            position = self._index.last_below(start, stop, minutes)
+            if position != -1:
+                return (position - self._origin) % self.period_length_days
+        return -1
+
+    def first_fit(
+        self,
+        days_to_allocate: int,
+        minutes_to_allocate: int,
+        start: int = 0,
+        stop: Optional[int] = None,
+    ) -> int:
+        """First shift in [start, stop) where the whole window fits or -1."""
+        last_shift = self.period_length_days - days_to_allocate
+        stop = last_shift + 1 if stop is None else min(stop, last_shift + 1)
+        if start >= stop:
+            return -1
+
+        if self._index is not None:
+            # the last blocking day of a window lets the search jump past it
+            shift = start
+            while shift < stop:
+                blocking = self._last_blocking_day(
+                    shift, days_to_allocate, minutes_to_allocate
+                )
+                if blocking == -1:
+                    return shift
+                shift = blocking + 1
+            return -1
+
+        window = self.free_minutes(start, stop + days_to_allocate - 1)
+        feasible = (
+            sliding_window_view(window, days_to_allocate).min(axis=1)
+            >= minutes_to_allocate
+        )
+        return start + int(feasible.argmax()) if feasible.any() else -1
+
     def can_allocate(
         self,
         days_to_allocate: int,
@@ -115,10 +368,196 @@ class Period:
         minutes_to_allocate: int,
         shift: Optional[int] = 0,
     ):
-        if not self.can_allocate(days_to_allocate, minutes_to_allocate, shift):
-            raise AllocationError(minutes_to_allocate)
+        with self.lock:
+            if not self.can_allocate(days_to_allocate, minutes_to_allocate, shift):
+                raise AllocationError(minutes_to_allocate)
+
+            return self._allocate_row(minutes_to_allocate, days_to_allocate, shift)
+
+    def release(
+        self,
+        days_to_release: int,
+        minutes_to_release: int,
+        shift: Optional[int] = 0,
+    ):
+        with self.lock:
+            if shift + days_to_release > self.period_length_days:
+                raise NotEnoughDaysError
+
+            return self._release_row(minutes_to_release, days_to_release, shift)
+
+    def take(self, minutes_per_day: np.ndarray):
+        """Take ``minutes_per_day[d]`` off day d in one pass, e.g. a replayed log.
+
+        Negative entries give minutes back, up to the day length. Nothing
+        changes if a day would drop below zero. Slots aren't updated.
+        """
+        with self.lock:
+            days = len(minutes_per_day)
+            if days > self.period_length_days:
+                raise NotEnoughDaysError
+
+            updates = []
+            offset = 0
+            for start, stop in self._segments(0, days):
+                window = self._time_left[start:stop]
+                updated = window - minutes_per_day[offset : offset + len(window)]
+                if (updated < 0).any():
+                    raise AllocationError(int(minutes_per_day[offset:].max()))
+                np.minimum(updated, self.day_length_minutes, out=updated)
+                updates.append((window, updated))
+                offset += len(window)
+
+            for window, updated in updates:
+                self._busy_days += self._count_busy(updated) - self._count_busy(window)
+                self._free_minutes_total += int(updated.sum() - window.sum())
+                window[:] = updated
+            if self._index is not None:
+                self._index = CapacityIndex(self._time_left)
+            self.version += 1
+            return self
+
+    def first_free_slot(
+        self, days_to_allocate: int, minutes_to_allocate: int, shift: int = 0
+    ) -> Optional[int]:
+        """Earliest start minute free on every day of the window or None."""
+        return self.slots.first_free(
+            self.day_offset + shift, days_to_allocate, minutes_to_allocate
+        )
+
+    def _update_gaps(self, days: int, shift: int):
+        for day in range(shift, shift + days):
+            self._largest_gap[self._cell(day)] = self.slots.largest_gap(
+                self.day_offset + day
+            )
+
+    def allocate_slot(
+        self,
+        days_to_allocate: int,
+        minutes_to_allocate: int,
+        shift: int = 0,
+        start_minute: Optional[int] = None,
+    ) -> int:
+        """Book the same slot on every day of the window, returns its start minute.
+
+        Without ``start_minute`` the earliest free slot is taken.
+        """
+        with self.lock:
+            if not self.can_allocate(days_to_allocate, minutes_to_allocate, shift):
+                raise AllocationError(minutes_to_allocate)
+
+            first_day = self.day_offset + shift
+            if start_minute is None:
+                start_minute = self.slots.first_free(
+                    first_day, days_to_allocate, minutes_to_allocate
+                )
+                if start_minute is None:
+                    raise AllocationError(minutes_to_allocate)
+            elif not self.slots.is_free(
+                first_day, days_to_allocate, start_minute, minutes_to_allocate
+            ):
+                raise SlotError(start_minute, minutes_to_allocate)
+
+            self.slots.book(
+                first_day, days_to_allocate, start_minute, minutes_to_allocate
+            )
+            self._update_gaps(days_to_allocate, shift)
+            self._allocate_row(minutes_to_allocate, days_to_allocate, shift)
+            return start_minute
+
+    def release_slot(
+        self,
+        days_to_release: int,
+        minutes_to_release: int,
+        shift: int,
+        start_minute: int,
+    ):
+        with self.lock:
+            if shift + days_to_release > self.period_length_days:
+                raise NotEnoughDaysError
+
+            self.slots.free(
+                self.day_offset + shift,
+                days_to_release,
+                start_minute,
+                minutes_to_release,
+            )
+            self._update_gaps(days_to_release, shift)
+            return self._release_row(minutes_to_release, days_to_release, shift)
+
+    def advance(self, days: int):
+        """Retire the first ``days`` days, the same number of empty days opens at the end."""
+        with self.lock:
+            if self.slots is not None:
+                self.slots.retire(self.day_offset, min(days, self.period_length_days))
+            self.day_offset += days
+            days = min(days, self.period_length_days)
+            for start, stop in self._segments(0, days):
+                window = self._time_left[start:stop]
+                self._free_minutes_total += int(
+                    self.day_length_minutes * len(window) - window.sum()
+                )
+                self._busy_days -= self._count_busy(window)
+                window[:] = self.day_length_minutes
+                if self._largest_gap is not None:
+                    self._largest_gap[start:stop] = self.day_length_minutes
+
+                if self._index is not None:
+                    for position in range(start, stop):
+                        self._index.set(position, self.day_length_minutes)
+
+            self._origin = (self._origin + days) % self.period_length_days
+            self.version += 1
+            return self
+
+    def load(self, time_left: np.ndarray, origin: int = 0, day_offset: int = 0):
+        """Keep the minutes in ``time_left`` from now on, e.g. a memory-mapped row.
+
+        ``origin`` is the cell of day 0, the running totals are recounted.
+        Slots aren't part of the array, slotted periods can't load one.
+        """
+        with self.lock:
+            self._time_left = time_left
+            self.period_length_days = len(time_left)
+            self._origin = origin
+            self.day_offset = day_offset
+            self._free_minutes_total = int(time_left.sum(dtype=np.int64))
+            self._busy_days = self._count_busy(time_left)
+            if self._index is not None:
+                self._index = CapacityIndex(time_left)
+            self.version += 1
+            return self
+
+    def extend(self, period_length_days: int):
+        """Grow the period to ``period_length_days``, new days are empty.
+
+        The ring is unrolled into the new array, so day 0 starts at its
+        first cell again.
+        """
+        with self.lock:
+            added_days = period_length_days - self.period_length_days
+            if added_days <= 0:
+                return self
+
+            time_left = np.full(
+                period_length_days, self.day_length_minutes, dtype=np.int32
+            )
+            time_left[: self.period_length_days] = self.free_minutes()
+            self._time_left = time_left
+            if self._largest_gap is not None:
+                largest_gap = np.full(
+                    period_length_days, self.day_length_minutes, dtype=np.int32
+                )
+                largest_gap[: self.period_length_days] = self.largest_gaps()
+                self._largest_gap = largest_gap
+            self._origin = 0
+            self.period_length_days = period_length_days
+            self._free_minutes_total += added_days * self.day_length_minutes
 
-        return self._allocate_row(minutes_to_allocate, days_to_allocate, shift)
+            if self._index is not None:
+                self._index = CapacityIndex(self._time_left)
+            self.version += 1
+            return self
 
 
 class MachineUsage:
@@ -138,6 +577,21 @@ class CalendarRow(dict):
 
 
 class MachineCalendar:
+    """Periods of every machine, the ledger of their appointments.
+
+    Bookings and cancellations hold ``lock`` shared and run concurrently,
+    each period serializes the changes of its machine. Moves, ``advance``,
+    ``grow``, ``copy`` and ``replace`` hold it exclusive. Reads take no lock.
+
+    With a ``storage`` file the periods keep their minutes in it, see
+    ``scheduling.storage.CalendarFile``. With a ``log`` every booking,
+    cancellation, move and advance is appended to it, see
+    ``scheduling.wal.AllocationLog``.
+    """
+
+    # a single writer may hold ``lock`` exclusive over a pass of changes
+    batch_locking = True
+
     def __str__(self):
         return f"{self.__class__.__name__}(calendar={self.calendar})"
 
@@ -145,75 +599,456 @@ class MachineCalendar:
         return self.__str__()
 
     def __init__(
-        self, machine_pool: "MachinePool", calendar_length_days: int = YEAR_LEN_DAYS
+        self,
+        machine_pool: "MachinePool",
+        calendar_length_days: int = YEAR_LEN_DAYS,
+        indexed: bool = False,
+        max_calendar_length_days: Optional[int] = None,
+        slotted: bool = False,
+        reservation: Optional["CapacityReservation"] = None,
     ):
         self.calendar_length_days = calendar_length_days
+        # None keeps the calendar at its initial length
+        self.max_calendar_length_days = max_calendar_length_days
+        self.indexed = indexed
+        # courses get a start minute, see ``Period.allocate_slot``
+        self.slotted = slotted
         self.calendar = {
-            machine: Period(calendar_length_days)
+            machine: Period(calendar_length_days, indexed=indexed, slotted=slotted)
             for machine in machine_pool.get_all_machines()
         }
+        self._sorted_machines = sorted(
+            self.calendar.keys(), key=lambda machine: machine.name()
+        )
+        self._version = 0
+        self.ledger = AppointmentLedger()
+        # minutes held back for scarce cancers, the scheduler keeps others off them
+        self.reservation = reservation
+        # calendar day of shift 0, moves forward with ``advance``
+        self.current_day = 0
+        self.lock = SharedLock()
+        self.storage: Optional["CalendarFile"] = None
+        self.log: Optional["AllocationLog"] = None
+
+    @property
+    def version(self) -> int:
+        """Mutation counter, grows with every change of any machine's period."""
+        return self._version + sum(period.version for period in self.calendar.values())
+
+    @version.setter
+    def version(self, version: int):
+        """Continue counting from ``version``, e.g. of a stored calendar."""
+        self._version = version - sum(
+            period.version for period in self.calendar.values()
+        )
 
     def __getitem__(self, item: BaseMachine):
         return self.calendar[item]
 
-    def get_daily_load(self, shift: int):
-        daily_load = {"items": [], "average_load": 0}
+    def _row(self, machine: BaseMachine) -> int:
+        """Position of ``machine`` in ``sorted_machines``, its row in files and logs."""
+        return self._sorted_machines.index(machine)
 
-        if shift >= self.calendar_length_days:
-            raise NotEnoughDaysError
+    def book(
+        self,
+        patient: "Patient",
+        machine: BaseMachine,
+        shift: int,
+        days: int,
+        minutes: int,
+        start_minute: Optional[int] = None,
+    ) -> Appointment:
+        """Allocate a course on a machine and record it in the ledger.
+
+        Slotted calendars book ``start_minute`` or the earliest free slot.
+        """
+        with self.lock.shared():
+            start_minute = self._allocate(
+                patient.cancer.name(), machine, shift, days, minutes, start_minute
+            )
+            appointment = self.ledger.add(
+                patient, machine, self.current_day + shift, days, minutes, start_minute
+            )
+            if self.log is not None:
+                self.log.allocated(
+                    self._row(machine),
+                    appointment.start_day,
+                    days,
+                    minutes,
+                    appointment.appointment_id,
+                    self.version,
+                )
+            self._record_version()
+            return appointment
+
+    def _record_version(self):
+        # the minutes reach a storage file's pages right away, so must the version
+        if self.storage is not None:
+            self.storage.record_version(self.version)
+
+    def _allocate(
+        self,
+        cancer_name: str,
+        machine: BaseMachine,
+        shift: int,
+        days: int,
+        minutes: int,
+        start_minute: Optional[int],
+    ) -> Optional[int]:
+        period = self.calendar[machine]
+        if self.slotted:
+            start_minute = period.allocate_slot(days, minutes, shift, start_minute)
+        else:
+            period.allocate(days, minutes, shift)
+        if self.reservation is not None:
+            self.reservation.consume(
+                machine, cancer_name, self.current_day + shift, days, minutes
+            )
+        return start_minute
+
+    def _release(self, appointment: Appointment) -> Optional[Tuple[int, int]]:
+        """Give back the remaining days, returns their first calendar day and count."""
+        shift = self.shift_of(appointment)
+        days = appointment.days + min(shift, 0)  # elapsed days are gone already
+        if days <= 0:
+            return None
+        period = self.calendar[appointment.machine]
+        if appointment.start_minute is not None:
+            period.release_slot(
+                days,
+                appointment.allocated_time_minutes,
+                max(shift, 0),
+                appointment.start_minute,
+            )
+        else:
+            period.release(days, appointment.allocated_time_minutes, max(shift, 0))
+        if self.reservation is not None:
+            self.reservation.give_back(
+                appointment.machine,
+                appointment.cancer_name,
+                self.current_day + max(shift, 0),
+                days,
+                appointment.allocated_time_minutes,
+            )
+        return self.current_day + max(shift, 0), days
+
+    def _log_release(
+        self, appointment: Appointment, released: Optional[Tuple[int, int]]
+    ):
+        if self.log is not None and released is not None:
+            start_day, days = released
+            self.log.released(
+                self._row(appointment.machine),
+                start_day,
+                days,
+                appointment.allocated_time_minutes,
+                appointment.appointment_id,
+                self.version,
+            )
+
+    def cancel(self, appointment_id: int) -> Appointment:
+        """Drop an appointment and give its remaining minutes back to the machine."""
+        with self.lock.shared():
+            appointment = self.ledger.remove(appointment_id)
+            self._log_release(appointment, self._release(appointment))
+            self._record_version()
+            return appointment
+
+    def move(
+        self,
+        appointment_id: int,
+        machine: BaseMachine,
+        shift: int,
+        start_minute: Optional[int] = None,
+    ) -> Appointment:
+        """Rebook an appointment that hasn't started on ``machine`` from ``shift``.
+
+        If the new place doesn't fit the appointment keeps its old one and
+        the allocation error is raised.
+        """
+        with self.lock.exclusive():
+            appointment = self.ledger.get(appointment_id)
+            old_shift = self.shift_of(appointment)
+            if old_shift <= 0:
+                raise AppointmentStartedError(appointment_id)
+            if shift <= 0:
+                raise InvalidDayError(self.current_day + shift, self.current_day)
+
+            days = appointment.days
+            minutes = appointment.allocated_time_minutes
+            released = self._release(appointment)
+            try:
+                start_minute = self._allocate(
+                    appointment.cancer_name, machine, shift, days, minutes, start_minute
+                )
+            except (AllocationError, NotEnoughDaysError, SlotError):
+                self._allocate(
+                    appointment.cancer_name,
+                    appointment.machine,
+                    old_shift,
+                    days,
+                    minutes,
+                    appointment.start_minute,
+                )
+                raise
+            self._log_release(appointment, released)
+            appointment = self.ledger.move(
+                appointment_id, machine, self.current_day + shift, start_minute
+            )
+            if self.log is not None:
+                self.log.allocated(
+                    self._row(machine),
+                    appointment.start_day,
+                    days,
+                    minutes,
+                    appointment_id,
+                    self.version,
+                )
+            self._record_version()
+            return appointment
 
-        machines = sorted(
-            [machine for machine in self.calendar.keys()],
-            key=lambda machine: machine.name(),
+    def copy(self) -> "MachineCalendar":
+        """Independent copy of the calendar and its ledger, machines are shared."""
+        with self.lock.exclusive():
+            return self._copy()
+
+    def _copy(self) -> "MachineCalendar":
+        return copy.deepcopy(self, {id(machine): machine for machine in self.calendar})
+
+    # copies are in memory, only the original writes to the storage file and log
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        del state["storage"]
+        del state["log"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = SharedLock()
+        self.storage = None
+        self.log = None
+
+    def replace(self, other: "MachineCalendar", expected_version: int) -> bool:
+        """Take over the state of ``other`` if still at ``expected_version``.
+
+        Callers keep their reference, the swap waits for running bookings.
+        The log can't replay a swap, so it is checkpointed before bookings
+        resume.
+        """
+        with self.lock.exclusive():
+            if self.version != expected_version:
+                return False
+            state = other.__getstate__()
+            self.__dict__.update(state)
+            if self.storage is not None:
+                self.storage.write(self)
+            if self.log is not None:
+                self.log.write_checkpoint(self._copy(), self.log.rotate())
+            return True
+
+    def shift_of(self, appointment: Appointment) -> int:
+        """Start of an appointment relative to the current day."""
+        return appointment.start_day - self.current_day
+
+    def advance(self, days: int):
+        """Move the current day forward, retiring elapsed days on every machine."""
+        with self.lock.exclusive():
+            return self._advance(days)
+
+    def advance_to(self, day: int):
+        with self.lock.exclusive():
+            return self._advance(day - self.current_day)
+
+    def _advance(self, days: int):
+        if days < 0:
+            raise InvalidDayError(self.current_day + days, self.current_day)
+        if days:
+            for period in self.calendar.values():
+                period.advance(days)
+            self.current_day += days
+            if self.storage is not None:
+                self.storage.write_header(self)
+            if self.log is not None:
+                self.log.advanced(self.current_day, self.version)
+        return self
+
+    def can_grow(self) -> bool:
+        return (
+            self.max_calendar_length_days is not None
+            and self.calendar_length_days < self.max_calendar_length_days
         )
-        sum_percentages = 0
-        for machine in machines:
-
-            load_level = self.calendar[machine].days[shift].load_level()
-            utilization_percentage = round((1 - load_level) * 100, 2)
-            daily_load["items"].append(
-                {
-                    "machine_name": machine.name(),
-                    "load": utilization_percentage,
-                }
+
+    def grow(self, min_length_days: int = 0) -> bool:
+        """Extend every machine's period, doubling the length up to the cap.
+
+        Doubling keeps the copying amortized over the days added. Returns
+        False if the calendar is already at its cap, True right away if
+        another thread already grew it to ``min_length_days``.
+        """
+        with self.lock.exclusive():
+            if min_length_days and self.calendar_length_days >= min_length_days:
+                return True
+            if not self.can_grow():
+                return False
+
+            length = min(
+                max(2 * self.calendar_length_days, min_length_days),
+                self.max_calendar_length_days,
             )
+            for period in self.calendar.values():
+                period.extend(length)
+            self.calendar_length_days = length
+            if self.storage is not None:
+                self.storage.write(self)
+            return True
 
-            sum_percentages += (1 - load_level) * 100
+    def flush(self):
+        """Make the storage file and the log durable, a no-op in memory."""
+        if self.storage is not None:
+            with self.lock.shared():
+                self.storage.flush(self)
+        if self.log is not None:
+            self.log.sync()
 
-        daily_load["average_load"] = round(sum_percentages / len(machines), 2)
-        return daily_load
+    def sync(self):
+        """Wait until the logged changes are on disk, then checkpoint if due.
 
-    def get_report_data(
-        self, days: int = YEAR_LEN_DAYS, start_day: int = 0
-    ) -> PrettyTable:
-        machines = sorted(
-            [machine for machine in self.calendar.keys()],
-            key=lambda machine: machine.name(),
+        Concurrent callers share one fsync, see ``AllocationLog.sync``.
+        """
+        if self.log is None:
+            return
+        self.log.sync()
+        if self.log.checkpoint_due():
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Snapshot the calendar so the log replays from here, bounding recovery.
+
+        Only the snapshot and the switch to a new log segment hold the lock,
+        the snapshot is written while bookings go on.
+        """
+        if self.log is None:
+            return
+        with self.lock.exclusive():
+            snapshot, segment = self._copy(), self.log.rotate()
+        self.log.write_checkpoint(snapshot, segment)
+
+    def free_minutes_total(self) -> int:
+        return sum(period.free_minutes_total for period in self.calendar.values())
+
+    def busy_days(self) -> int:
+        return sum(period.busy_days for period in self.calendar.values())
+
+    def load_level(self) -> float:
+        """Average free share over all machines and days."""
+        return sum(period.load_level() for period in self.calendar.values()) / len(
+            self.calendar
         )
 
-        table = PrettyTable()
-        table.title = "Utilization report"
-        table.field_names = (
-            ["Day"] + [machine.name() for machine in machines] + ["Average"]
+    def free_minutes_matrix(
+        self, machines: List[BaseMachine], days: Optional[int] = None, start: int = 0
+    ) -> np.ndarray:
+        """Minutes left for shifts [start, days) as a (machines x days) matrix.
+
+        Rows follow ``machines``.
+        """
+        days = self.calendar_length_days if days is None else days
+        return np.vstack(
+            [self.calendar[machine].free_minutes(start, days) for machine in machines]
+        )
+
+    def largest_gap_matrix(
+        self, machines: List[BaseMachine], days: Optional[int] = None, start: int = 0
+    ) -> np.ndarray:
+        """Longest free run of shifts [start, days), slotted calendars only."""
+        days = self.calendar_length_days if days is None else days
+        return np.vstack(
+            [self.calendar[machine].largest_gaps(start, days) for machine in machines]
         )
 
-        for day_pointer in range(start_day, min(days, self.calendar_length_days)):
+    def sorted_machines(self) -> List[BaseMachine]:
+        return list(self._sorted_machines)
+
+    def machines_by_name(self, machine_names: List[str]) -> List[BaseMachine]:
+        machines = {machine.name(): machine for machine in self._sorted_machines}
+        for machine_name in machine_names:
+            if machine_name not in machines:
+                raise UnknownMachineError(machine_name)
+        return [machines[machine_name] for machine_name in machine_names]
+
+    def utilization_matrix(
+        self,
+        start_day: int = 0,
+        end_day: Optional[int] = None,
+        machines: Optional[List[BaseMachine]] = None,
+    ) -> np.ndarray:
+        """Used share of every day in percents, shape (machines x days)."""
+        machines = self.sorted_machines() if machines is None else machines
+        end_day = self.calendar_length_days if end_day is None else end_day
+        free = self.free_minutes_matrix(machines, end_day, start_day)
+        day_length = np.array(
+            [[self.calendar[machine].day_length_minutes] for machine in machines]
+        )
+        return (1 - free / day_length) * 100
+
+    def get_daily_load(self, shift: int):
+        if not 0 <= shift < self.calendar_length_days:
+            raise NotEnoughDaysError
+
+        utilization = self.utilization_matrix(shift, shift + 1)[:, 0]
+        return {
+            "items": [
+                {"machine_name": machine.name(), "load": round(float(load), 2)}
+                for machine, load in zip(self._sorted_machines, utilization)
+            ],
+            "average_load": round(float(utilization.mean()), 2),
+        }
 
-            row = [day_pointer + 1]  # just for managers, they don't like leading zero
+    def get_load_range(
+        self,
+        start: int,
+        end: int,
+        machine_names: Optional[List[str]] = None,
+        resolution: str = RESOLUTION_DAY,
+    ):
+        """Utilization of every machine for shifts [start, end).
 
-            sum_percentages = 0
-            for machine in machines:
-                load_level = self.calendar[machine].days[day_pointer].load_level()
-                utilization_percentage = round((1 - load_level) * 100, 2)
-                sum_percentages += (1 - load_level) * 100
-                row.append(f"{utilization_percentage}%")
+        Buckets of a week or a month hold the mean of their days, ``shifts``
+        are the first shift of every bucket.
+        """
+        if not 0 <= start < end <= self.calendar_length_days:
+            raise NotEnoughDaysError
+        if resolution not in LOAD_RESOLUTIONS:
+            raise InvalidResolutionError(resolution)
 
-            row.append(f"{round(sum_percentages / len(machines), 2)}%")
+        machines = (
+            self.machines_by_name(machine_names)
+            if machine_names
+            else self.sorted_machines()
+        )
+        utilization = self.utilization_matrix(start, end, machines)
 
-            table.add_row(row)
-            day_pointer += 1
+        bucket_starts = np.arange(0, end - start, LOAD_RESOLUTIONS[resolution])
+        bucket_sizes = np.diff(np.append(bucket_starts, end - start))
+        load = np.add.reduceat(utilization, bucket_starts, axis=1) / bucket_sizes
 
-        return table
+        return {
+            "machines": [machine.name() for machine in machines],
+            "shifts": (bucket_starts + start).tolist(),
+            "load": np.round(load.T, 2).tolist(),
+            "average_load": np.round(load.mean(axis=0), 2).tolist(),
+        }
+
+    def get_report(self, days: int = YEAR_LEN_DAYS, start_day: int = 0):
+        from scheduling.reports import UtilizationReport
+
+        return UtilizationReport.from_calendar(self, start_day, days)
+
+    def get_report_data(
+        self, days: int = YEAR_LEN_DAYS, start_day: int = 0
+    ) -> "PrettyTable":
+        return self.get_report(days, start_day).to_table()
 
     def visualize(self, ax):
         x = np.arange(self.calendar_length_days)
@@ -227,7 +1062,7 @@ class MachineCalendar:
         ) / num_bars_in_group
 
         for num, (machine, period) in enumerate(self.calendar.items()):
-            ys = [day.time_left() / 100 for day in period.days]
+            ys = period.free_minutes() / 100
             ax.bar(
                 x + num * bar_width,
                 ys,
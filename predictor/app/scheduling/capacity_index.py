@@ -0,0 +1,116 @@
+from typing import Iterable
+
+
+class CapacityIndex:
+    """Range-min segment tree with lazy range add.
+
+    Mirrors the free minutes of a period so that window checks, the
+    blocking-day lookups of ``Period.first_fit`` and range allocations take
+    logarithmic time.
+    """
+
+    def __str__(self):
+        return f"{self.__class__.__name__}(size={self._size})"
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __init__(self, values: Iterable[int]):
+        values = [int(value) for value in values]
+        self._size = len(values)
+        self._min = [0] * (4 * max(self._size, 1))
+        self._lazy = [0] * (4 * max(self._size, 1))
+        if self._size:
+            self._build(1, 0, self._size, values)
+
+    def __len__(self):
+        return self._size
+
+    def _build(self, node: int, lo: int, hi: int, values):
+        if hi - lo == 1:
+            self._min[node] = values[lo]
+            return
+        mid = (lo + hi) // 2
+        self._build(2 * node, lo, mid, values)
+        self._build(2 * node + 1, mid, hi, values)
+        self._min[node] = min(self._min[2 * node], self._min[2 * node + 1])
+
+    def _push(self, node: int):
+        lazy = self._lazy[node]
+        if lazy:
+            for child in (2 * node, 2 * node + 1):
+                self._min[child] += lazy
+                self._lazy[child] += lazy
+            self._lazy[node] = 0
+
+    def _add(self, node: int, lo: int, hi: int, start: int, stop: int, value: int):
+        if stop <= lo or hi <= start:
+            return
+        if start <= lo and hi <= stop:
+            self._min[node] += value
+            self._lazy[node] += value
+            return
+        self._push(node)
+        mid = (lo + hi) // 2
+        self._add(2 * node, lo, mid, start, stop, value)
+        self._add(2 * node + 1, mid, hi, start, stop, value)
+        self._min[node] = min(self._min[2 * node], self._min[2 * node + 1])
+
+    def _first_below(
+        self, node: int, lo: int, hi: int, start: int, stop: int, threshold: int
+    ):
+        if stop <= lo or hi <= start or self._min[node] >= threshold:
+            return -1
+        if hi - lo == 1:
+            return lo
+        self._push(node)
+        mid = (lo + hi) // 2
+        found = self._first_below(2 * node, lo, mid, start, stop, threshold)
+        if found != -1:
+            return found
+        return self._first_below(2 * node + 1, mid, hi, start, stop, threshold)
+
+    def _last_below(
+        self, node: int, lo: int, hi: int, start: int, stop: int, threshold: int
+    ):
+        if stop <= lo or hi <= start or self._min[node] >= threshold:
+            return -1
+        if hi - lo == 1:
+            return lo
+        self._push(node)
+        mid = (lo + hi) // 2
+        found = self._last_below(2 * node + 1, mid, hi, start, stop, threshold)
+        if found != -1:
+            return found
+        return self._last_below(2 * node, lo, mid, start, stop, threshold)
+
+    def _set(self, node: int, lo: int, hi: int, position: int, value: int):
+        if hi - lo == 1:
+            self._min[node] = value
+            self._lazy[node] = 0
+            return
+        self._push(node)
+        mid = (lo + hi) // 2
+        if position < mid:
+            self._set(2 * node, lo, mid, position, value)
+        else:
+            self._set(2 * node + 1, mid, hi, position, value)
+        self._min[node] = min(self._min[2 * node], self._min[2 * node + 1])
+
+    def add(self, start: int, stop: int, value: int):
+        """Add ``value`` to every position in [start, stop)."""
+        if start < stop:
+            self._add(1, 0, self._size, start, stop, value)
+        return self
+
+    def set(self, position: int, value: int):
+        self._set(1, 0, self._size, position, int(value))
+        return self
+
+    def first_below(self, start: int, stop: int, threshold: int) -> int:
+        """First position in [start, stop) below ``threshold`` or -1."""
+        return self._first_below(1, 0, self._size, start, stop, threshold)
+
+    def last_below(self, start: int, stop: int, threshold: int) -> int:
+        """Last position in [start, stop) below ``threshold`` or -1."""
+        return self._last_below(1, 0, self._size, start, stop, threshold)
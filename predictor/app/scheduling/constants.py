@@ -60,5 +60,49 @@ MACHINE_TYPES = [
     MACHINE_U,
 ]
 
+ORDER_ARRIVAL = "arrival"
+ORDER_LONGEST_FRACTION_FIRST = "longest_fraction_first"
+ORDER_MOST_CONSTRAINED_FIRST = "most_constrained_first"
+
+BATCH_ORDERINGS = [
+    ORDER_ARRIVAL,
+    ORDER_LONGEST_FRACTION_FIRST,
+    ORDER_MOST_CONSTRAINED_FIRST,
+]
+
+RESOLUTION_DAY = "day"
+RESOLUTION_WEEK = "week"
+RESOLUTION_MONTH = "month"
+
+LOAD_RESOLUTIONS = {
+    RESOLUTION_DAY: 1,
+    RESOLUTION_WEEK: 7,
+    RESOLUTION_MONTH: 30,
+}
+
+DAY_LENGTH_MINUTES = 8 * 60
+
 YEAR_LEN_DAYS = 356
 TWO_YEAR_LEN_DAYS = YEAR_LEN_DAYS * 2
+FIVE_YEAR_LEN_DAYS = YEAR_LEN_DAYS * 5
+
+# how much later than booked the optimizer may start a course, bookings
+# take the earliest feasible shift so without slack nothing can move
+OPTIMIZER_MAX_DELAY_DAYS = 14
+# cost of a day of delay per course, in the variance one course adds on one
+# day, so balancing has to buy more than the treatment it postpones
+OPTIMIZER_DELAY_WEIGHT = 1.0
+# the optimizer stops after this many iterations without a new best state
+OPTIMIZER_PATIENCE = 20_000
+
+# optimization job statuses
+JOB_RUNNING = "running"
+# the optimized calendar replaced the shared one
+JOB_SWAPPED = "swapped"
+# nothing better was found, the shared calendar is kept
+JOB_DISCARDED = "discarded"
+# the shared calendar changed while optimizing, the result is dropped
+JOB_STALE = "stale"
+JOB_FAILED = "failed"
+
+JOB_STATUSES = [JOB_RUNNING, JOB_SWAPPED, JOB_DISCARDED, JOB_STALE, JOB_FAILED]
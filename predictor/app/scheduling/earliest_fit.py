@@ -0,0 +1,130 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from scheduling.calendar import MachineCalendar
+from scheduling.machines import BaseMachine
+
+
+class EarliestFit:
+    """Earliest feasible window search.
+
+    Builds a (machines x days) free minutes matrix once and finds the first
+    shift where any of the machines has every day of the window free.
+    Machines are expected in preference order, ties on a shift go to the
+    first one. Indexed calendars are searched through their capacity index.
+
+    ``held`` minutes, a (machines x days) matrix from the start of the
+    calendar, are treated as taken, see ``CapacityReservation``.
+    """
+
+    @classmethod
+    def window_minimums(
+        cls,
+        machine_calendar: MachineCalendar,
+        machines: List[BaseMachine],
+        days: int,
+        horizon: int,
+        held: Optional[np.ndarray] = None,
+    ):
+        """Smallest free minutes of every window, shape (machines x shifts)."""
+        length = min(horizon + days - 1, machine_calendar.calendar_length_days)
+        free = machine_calendar.free_minutes_matrix(machines, length)
+        if held is not None:
+            free = free - held[:, :length]
+        return sliding_window_view(free, days, axis=1).min(axis=2)
+
+    @classmethod
+    def find(
+        cls,
+        machine_calendar: MachineCalendar,
+        machines: List[BaseMachine],
+        days: int,
+        minutes: int,
+        horizon: int,
+        held: Optional[np.ndarray] = None,
+    ) -> Optional[Tuple[BaseMachine, int]]:
+        """First (machine, shift) with ``minutes`` free on ``days`` days in a row.
+
+        Only shifts in ``range(horizon)`` are considered.
+        """
+        if not machines or horizon <= 0:
+            return None
+        if machine_calendar.indexed and held is None:
+            return cls.find_indexed(machine_calendar, machines, days, minutes, horizon)
+        if min(horizon + days - 1, machine_calendar.calendar_length_days) < days:
+            return None
+
+        feasible = (
+            cls.window_minimums(machine_calendar, machines, days, horizon, held)
+            >= minutes
+        )
+        shifts = feasible.any(axis=0)
+        if not shifts.any():
+            return None
+
+        shift = int(shifts.argmax())
+        return machines[int(feasible[:, shift].argmax())], shift
+
+    @classmethod
+    def find_indexed(
+        cls,
+        machine_calendar: MachineCalendar,
+        machines: List[BaseMachine],
+        days: int,
+        minutes: int,
+        horizon: int,
+    ) -> Optional[Tuple[BaseMachine, int]]:
+        """Same as ``find`` using the per-machine capacity index.
+
+        Later machines only need to beat the best shift found so far.
+        """
+        placement = None
+        for machine in machines:
+            stop = horizon if placement is None else placement[1]
+            shift = machine_calendar[machine].first_fit(days, minutes, 0, stop)
+            if shift != -1:
+                placement = machine, shift
+                if not shift:
+                    break
+        return placement
+
+    @classmethod
+    def find_slot(
+        cls,
+        machine_calendar: MachineCalendar,
+        machines: List[BaseMachine],
+        days: int,
+        minutes: int,
+        horizon: int,
+        held: Optional[np.ndarray] = None,
+    ) -> Optional[Tuple[BaseMachine, int, int]]:
+        """First (machine, shift, start minute) with a free slot on every day.
+
+        Windows where a day has less minutes or a shorter free run than
+        needed are ruled out at once, only the rest are checked against the
+        booked intervals, shift by shift in machine preference order.
+        """
+        if not machines or horizon <= 0:
+            return None
+        length = min(horizon + days - 1, machine_calendar.calendar_length_days)
+        if length < days:
+            return None
+
+        feasible = (
+            cls.window_minimums(machine_calendar, machines, days, horizon, held)
+            >= minutes
+        )
+        gaps = machine_calendar.largest_gap_matrix(machines, length)
+        feasible &= sliding_window_view(gaps, days, axis=1).min(axis=2) >= minutes
+
+        shifts, rows = np.nonzero(feasible.T)
+        for shift, row in zip(shifts.tolist(), rows.tolist()):
+            machine = machines[row]
+            start_minute = machine_calendar[machine].first_free_slot(
+                days, minutes, shift
+            )
+            if start_minute is not None:
+                return machine, shift, start_minute
+        return None
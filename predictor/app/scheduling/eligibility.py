@@ -0,0 +1,50 @@
+from typing import Dict, List, Tuple, Type
+
+import numpy as np
+
+from scheduling.diseases import Cancer, CANCER_MAP
+from scheduling.machines import BaseMachine
+
+
+class EligibilityIndex:
+    """Flat view of a machine pool tree.
+
+    Holds a (cancer types x machines) capability matrix and, read from it,
+    the treatments the pool covers and per cancer type the tuple of
+    machines that can take a patient right now, sorted by name.
+    """
+
+    def __str__(self):
+        return (
+            f"{self.__class__.__name__}"
+            f"(cancers={len(self.cancers)}, machines={len(self.machines)})"
+        )
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __init__(self, machines: List[BaseMachine]):
+        self.cancers = tuple(CANCER_MAP.values())
+        self.machines = tuple(sorted(machines, key=lambda machine: machine.name()))
+        self.capability = np.array(
+            [
+                [cancer in machine.available_treatments for machine in self.machines]
+                for cancer in self.cancers
+            ],
+            dtype=bool,
+        ).reshape(len(self.cancers), len(self.machines))
+        free = np.array(
+            [not machine.is_allocated for machine in self.machines], dtype=bool
+        )
+        self.eligible: Dict[Type[Cancer], Tuple[BaseMachine, ...]] = {
+            cancer: tuple(self.machines[column] for column in np.flatnonzero(row))
+            for cancer, row in zip(self.cancers, self.capability & free)
+        }
+        self.treatments = frozenset(
+            cancer
+            for cancer, capable in zip(self.cancers, self.capability.any(axis=1))
+            if capable
+        )
+
+    def select_machines(self, cancer: Cancer) -> Tuple[BaseMachine, ...]:
+        return self.eligible.get(cancer.__class__, ())
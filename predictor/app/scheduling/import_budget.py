@@ -0,0 +1,65 @@
+"""Cold start budget check for the API process.
+
+Imports the web server in a fresh interpreter and fails if it takes too
+long, uses too much memory or pulls in modules that are only needed for
+plotting, table rendering or fake names.
+
+    python -m scheduling.import_budget --seconds 1.0 --rss-mb 80
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+LAZY_MODULES = ("matplotlib", "prettytable", "faker")
+
+_PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import {module}
+print(json.dumps({{
+    "seconds": time.perf_counter() - started,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "loaded": [m for m in {lazy!r} if m in sys.modules],
+}}))
+"""
+
+
+def measure(module: str = "webserver") -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module, lazy=LAZY_MODULES)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def check(module: str, max_seconds: float, max_rss_mb: float) -> list:
+    stats = measure(module)
+    print(
+        f"import {module}: {stats['seconds']:.3f}s, "
+        f"max RSS {stats['rss_mb']:.1f} MB"
+    )
+
+    errors = []
+    if stats["seconds"] > max_seconds:
+        errors.append(f"import took {stats['seconds']:.3f}s > {max_seconds}s")
+    if stats["rss_mb"] > max_rss_mb:
+        errors.append(f"max RSS {stats['rss_mb']:.1f} MB > {max_rss_mb} MB")
+    for loaded in stats["loaded"]:
+        errors.append(f"{loaded} is imported eagerly")
+    return errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="webserver")
+    parser.add_argument("--seconds", type=float, default=1.0)
+    parser.add_argument("--rss-mb", type=float, default=80.0)
+    args = parser.parse_args()
+
+    errors = check(args.module, args.seconds, args.rss_mb)
+    for error in errors:
+        print(f"FAIL: {error}")
+    sys.exit(1 if errors else 0)
@@ -0,0 +1,106 @@
+import threading
+from contextlib import contextmanager
+
+
+class SharedLock:
+    """Readers-writer lock, many shared holders or a single exclusive one.
+
+    Waiting exclusive holders go first, so a stream of shared holders can't
+    starve them. A thread holding it shared may take it shared again, the
+    exclusive holder may take it again either way. A shared holder can't
+    take it exclusive.
+    """
+
+    def __str__(self):
+        return (
+            f"{self.__class__.__name__}(shared={self._shared}, "
+            f"exclusive={self._exclusive})"
+        )
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._shared = 0
+        self._exclusive = False
+        self._exclusive_waiting = 0
+        # thread holding it exclusive, its nested holds pass straight through
+        self._owner = None
+        self._local = threading.local()
+
+    # copies get a fresh, unlocked lock
+    def __getstate__(self):
+        return {}
+
+    def __setstate__(self, state):
+        self.__init__()
+
+    def held_exclusive(self) -> bool:
+        """Whether the calling thread holds it exclusive."""
+        return self._owner == threading.get_ident()
+
+    @contextmanager
+    def shared(self):
+        if self.held_exclusive():
+            yield
+            return
+        depth = getattr(self._local, "depth", 0)
+        if depth:
+            # waiting for a queued exclusive holder here would deadlock
+            self._local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._local.depth = depth
+            return
+
+        with self._condition:
+            while self._exclusive or self._exclusive_waiting:
+                self._condition.wait()
+            self._shared += 1
+        self._local.depth = 1
+        try:
+            yield
+        finally:
+            self._local.depth = 0
+            with self._condition:
+                self._shared -= 1
+                if not self._shared:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        if self.held_exclusive():
+            yield
+            return
+        with self._condition:
+            self._exclusive_waiting += 1
+            while self._exclusive or self._shared:
+                self._condition.wait()
+            self._exclusive_waiting -= 1
+            self._exclusive = True
+        self._owner = threading.get_ident()
+        try:
+            yield
+        finally:
+            self._owner = None
+            with self._condition:
+                self._exclusive = False
+                self._condition.notify_all()
+
+
+class LockState:
+    """Pickling support for classes holding a ``threading.Lock`` in ``lock``.
+
+    Copies, including ``copy.deepcopy``, get a fresh lock.
+    """
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
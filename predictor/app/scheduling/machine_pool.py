@@ -2,6 +2,7 @@ from typing import List, Union
 
 from scheduling.base import AllocatableEntity
 from scheduling.diseases import Cancer
+from scheduling.eligibility import EligibilityIndex
 from scheduling.machines import BaseMachine
 
 
@@ -13,6 +14,27 @@ class MachinePool(AllocatableEntity):
     def name(self):
         return self._name
 
+    @property
+    def machines(self) -> List[Union[BaseMachine, "MachinePool"]]:
+        return self._machines
+
+    @machines.setter
+    def machines(self, machines: List[Union[BaseMachine, "MachinePool"]]):
+        self._machines = machines
+        self.invalidate()
+
+    def invalidate(self):
+        """Drop cached indexes, call after changing the pool tree in place."""
+        self._index = None
+        self.state_changed()
+
+    def eligibility_index(self) -> EligibilityIndex:
+        """Compiled pool tree, rebuilt only after a state change."""
+        if self._index is None or self._index_version != self.state_version():
+            self._index = EligibilityIndex(self.get_all_machines())
+            self._index_version = self.state_version()
+        return self._index
+
     def get_all_machines(self) -> List[BaseMachine]:
         machines = []
         for machine in self.machines:
@@ -47,10 +69,10 @@ class MachinePool(AllocatableEntity):
         return treatments
 
     def select_machines(self, cancer: Cancer):
-        return self.machine_gen(cancer)
+        return self.eligibility_index().select_machines(cancer)
 
     def can_treat(self, cancer: Cancer):
-        return cancer.__class__ in self.available_treatments
+        return cancer.__class__ in self.eligibility_index().treatments
 
     def machine_gen(self, cancer: Cancer):
 
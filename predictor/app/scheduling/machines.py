@@ -1,5 +1,6 @@
 import datetime
-from typing import Set
+from functools import lru_cache
+from typing import Set, Type
 
 from scheduling.constants import (
     MACHINE_TB1,
@@ -39,6 +40,11 @@ class InvalidCancerType(Exception):
         super().__init__("Invalid cancer type")
 
 
+@lru_cache(maxsize=None)
+def _probability_to_treat(machine_class: Type["BaseMachine"]) -> float:
+    return sum(cancer.probability() for cancer in machine_class._available_treatments)
+
+
 class BaseMachine(AllocatableEntity):
     _name: str
     _available_treatments: Set[Cancer]
@@ -60,7 +66,7 @@ class BaseMachine(AllocatableEntity):
 
     @classmethod
     def probability_to_treat(cls):
-        return sum(cancer.probability() for cancer in cls._available_treatments)
+        return _probability_to_treat(cls)
 
     def __str__(self):
         return f"{self.__class__.__name__}(name={self.name()})"
@@ -83,12 +89,14 @@ class BaseMachine(AllocatableEntity):
             self._allocated = True
         else:
             raise
+        self.state_changed()
         return self
 
     def deallocate(self):
         if not self._allocated:
             raise AlreadyDeallocated
         self._allocated = False
+        self.state_changed()
         return self
 
     def to_dict(self):
@@ -112,10 +120,12 @@ class BaseMachine(AllocatableEntity):
 
     def set_maintenance(self):
         self._on_maintenance = True
+        self.state_changed()
         return self._on_maintenance
 
     def unset_maintenance(self):
         self._on_maintenance = False
+        self.state_changed()
         return self._on_maintenance
 
     def machine_gen(self, cancer: Cancer):
@@ -0,0 +1,259 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from scheduling.calendar import MachineCalendar
+
+# latency buckets in seconds, from a cheap array check to a slow request
+LATENCY_BUCKETS = (
+    0.00001,
+    0.00005,
+    0.0001,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    5.0,
+)
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name, value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+        )
+        for name, value in labels
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base of the metric types, values are kept per label set."""
+
+    type_name = ""
+
+    def __str__(self):
+        return f"{self.__class__.__name__}(name={self.name})"
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+        return tuple((name, str(labels[name])) for name in self.labelnames)
+
+    def samples(self) -> Iterable[Tuple[str, Tuple[Tuple[str, str], ...], float]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield self.name, labels, value
+
+
+class Gauge(Metric):
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield self.name, labels, value
+
+
+class Histogram(Metric):
+    """Cumulative bucket counts, a sum and a count per label set."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [count per bucket + overflow, sum]
+        self._values: Dict[Tuple, List] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][position] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return sum(state[0]) if state else 0
+
+    def samples(self):
+        with self._lock:
+            values = sorted(
+                (labels, (list(counts), total))
+                for labels, (counts, total) in self._values.items()
+            )
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket",
+                    labels + (("le", _format_value(float(bound))),),
+                    cumulative,
+                )
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+PLACEMENT_SECONDS = REGISTRY.register(
+    Histogram("scheduler_placement_seconds", "Time to place one patient")
+)
+SHIFTS_SCANNED = REGISTRY.register(
+    Counter("scheduler_shifts_scanned_total", "Shifts searched for a placement")
+)
+MACHINES_TRIED = REGISTRY.register(
+    Counter("scheduler_machines_tried_total", "Eligible machines searched")
+)
+SHIFTS_SKIPPED = REGISTRY.register(
+    Counter(
+        "scheduler_shifts_skipped_total",
+        "Shifts passed over before the one a patient was placed on",
+    )
+)
+COMMIT_CONFLICTS = REGISTRY.register(
+    Counter(
+        "scheduler_commit_conflicts_total",
+        "Placements lost to a concurrent booking and searched again",
+    )
+)
+EXTEND_SCHEDULE_ERRORS = REGISTRY.register(
+    Counter(
+        "scheduler_extend_schedule_errors_total",
+        "Patients that didn't fit into the calendar",
+        ["cancer"],
+    )
+)
+HTTP_REQUEST_SECONDS = REGISTRY.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Time to serve a request",
+        ["method", "route", "status"],
+    )
+)
+FREE_MINUTES = REGISTRY.register(
+    Gauge("calendar_free_minutes", "Free minutes left over the horizon", ["machine"])
+)
+HORIZON_FILL = REGISTRY.register(
+    Gauge("calendar_horizon_fill_ratio", "Booked share of the minutes of the horizon")
+)
+CALENDAR_LENGTH = REGISTRY.register(
+    Gauge("calendar_length_days", "Days in the calendar horizon")
+)
+CURRENT_DAY = REGISTRY.register(Gauge("calendar_current_day", "Calendar day of shift 0"))
+
+
+def observe_calendar(machine_calendar: "MachineCalendar"):
+    """Refresh the calendar gauges, running totals make it cheap."""
+    capacity = 0
+    for machine in machine_calendar.sorted_machines():
+        period = machine_calendar[machine]
+        FREE_MINUTES.set(period.free_minutes_total, machine=machine.name())
+        capacity += period.period_length_days * period.day_length_minutes
+    if capacity:
+        HORIZON_FILL.set(1 - machine_calendar.free_minutes_total() / capacity)
+    CALENDAR_LENGTH.set(machine_calendar.calendar_length_days)
+    CURRENT_DAY.set(machine_calendar.current_day)
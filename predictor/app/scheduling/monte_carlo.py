@@ -0,0 +1,210 @@
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, Generator, List, Optional
+
+import numpy as np
+
+from scheduling.calendar import MachineCalendar
+from scheduling.constants import TWO_YEAR_LEN_DAYS
+from scheduling.machine_pool import MachinePool
+from scheduling.patients import PatientGen
+from scheduling.reservation import CapacityReservation
+from scheduling.scheduler import Scheduler
+from scheduling.simulation import Simulation
+from scheduling.utils import build_machine_pool
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+class RunConfig:
+    """Everything a worker process needs to repeat one simulation."""
+
+    def __init__(
+        self,
+        run: int,
+        seed: int,
+        period_length_days: int,
+        max_patients: Optional[int],
+        max_day: Optional[int],
+        stop_on_rejection: bool,
+        machine_pool_factory: Callable[[], MachinePool],
+        reservation_factory: Optional[
+            Callable[[MachinePool], CapacityReservation]
+        ] = None,
+    ):
+        self.run = run
+        self.seed = seed
+        self.period_length_days = period_length_days
+        self.max_patients = max_patients
+        self.max_day = max_day
+        self.stop_on_rejection = stop_on_rejection
+        self.machine_pool_factory = machine_pool_factory
+        self.reservation_factory = reservation_factory
+
+
+def run_simulation(config: RunConfig) -> Dict:
+    """Run one independent, seeded simulation on a fresh fleet and calendar."""
+    machine_pool = config.machine_pool_factory()
+    reservation = (
+        config.reservation_factory(machine_pool)
+        if config.reservation_factory
+        else None
+    )
+    scheduler = Scheduler(
+        period_length_days=config.period_length_days,
+        machine_pool=machine_pool,
+        patient_generator=PatientGen(random.Random(config.seed)),
+        machine_calendar=MachineCalendar(
+            machine_pool, config.period_length_days, reservation=reservation
+        ),
+    )
+    result = Simulation(
+        scheduler,
+        max_patients=config.max_patients,
+        max_day=config.max_day,
+        stop_on_rejection=config.stop_on_rejection,
+    ).run()
+    return {"run": config.run, "seed": config.seed, **result.to_dict()}
+
+
+def _distribution(values: List[float]) -> Dict[str, float]:
+    values = np.asarray(values, dtype=float)
+    if not values.size:
+        return {}
+    distribution = {"mean": float(values.mean()), "std": float(values.std())}
+    for percentile, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        distribution[f"p{percentile}"] = float(value)
+    return distribution
+
+
+class MonteCarlo:
+    """Independent simulations fanned out over a process pool.
+
+    Run seeds are spawned from ``master_seed``, so a given master seed always
+    produces the same set of runs whatever the number of workers.
+    """
+
+    def __init__(
+        self,
+        runs: int,
+        master_seed: int = 0,
+        period_length_days: int = TWO_YEAR_LEN_DAYS,
+        max_patients: Optional[int] = None,
+        max_day: Optional[int] = None,
+        stop_on_rejection: bool = True,
+        machine_pool_factory: Callable[[], MachinePool] = build_machine_pool,
+        workers: Optional[int] = None,
+        reservation_factory: Optional[
+            Callable[[MachinePool], CapacityReservation]
+        ] = None,
+    ):
+        self.runs = runs
+        self.master_seed = master_seed
+        self.period_length_days = period_length_days
+        self.max_patients = max_patients
+        self.max_day = max_day
+        self.stop_on_rejection = stop_on_rejection
+        self.machine_pool_factory = machine_pool_factory
+        self.workers = workers or os.cpu_count()
+        # picklable, e.g. CapacityReservation.from_pool
+        self.reservation_factory = reservation_factory
+
+    def configs(self) -> List[RunConfig]:
+        seeds = np.random.SeedSequence(self.master_seed).spawn(self.runs)
+        return [
+            RunConfig(
+                run=run,
+                seed=int(seed.generate_state(1)[0]),
+                period_length_days=self.period_length_days,
+                max_patients=self.max_patients,
+                max_day=self.max_day,
+                stop_on_rejection=self.stop_on_rejection,
+                machine_pool_factory=self.machine_pool_factory,
+                reservation_factory=self.reservation_factory,
+            )
+            for run, seed in enumerate(seeds)
+        ]
+
+    def iter_runs(self) -> Generator[Dict, None, None]:
+        """Per-run results in completion order."""
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = [
+                executor.submit(run_simulation, config) for config in self.configs()
+            ]
+            for future in as_completed(futures):
+                yield future.result()
+
+    @staticmethod
+    def aggregate(results: List[Dict]) -> Dict:
+        results = sorted(results, key=lambda result: result["run"])
+        machines = sorted({name for r in results for name in r["utilization"]})
+        cancers = sorted(
+            {
+                name
+                for r in results
+                for name in [*r["placed_by_cancer"], *r["rejected_by_cancer"]]
+            }
+        )
+        return {
+            "runs": len(results),
+            "saturation_shift": _distribution(
+                [
+                    r["saturation_shift"]
+                    for r in results
+                    if r["saturation_shift"] is not None
+                ]
+            ),
+            "saturated_runs": sum(
+                1 for r in results if r["saturation_shift"] is not None
+            ),
+            "rejection_rate": _distribution([r["rejection_rate"] for r in results]),
+            "patients_placed": _distribution([r["patients_placed"] for r in results]),
+            "utilization": {
+                machine: _distribution(
+                    [r["utilization"][machine] for r in results]
+                )
+                for machine in machines
+            },
+            "placed_by_cancer": {
+                cancer: _distribution(
+                    [r["placed_by_cancer"].get(cancer, 0) for r in results]
+                )
+                for cancer in cancers
+            },
+            "rejected_by_cancer": {
+                cancer: _distribution(
+                    [r["rejected_by_cancer"].get(cancer, 0) for r in results]
+                )
+                for cancer in cancers
+            },
+        }
+
+    def run(self) -> Dict:
+        return self.aggregate(list(self.iter_runs()))
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Monte Carlo capacity planning")
+    parser.add_argument("--runs", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--days", type=int, default=TWO_YEAR_LEN_DAYS)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--reserve",
+        action="store_true",
+        help="hold back capacity for scarce cancers",
+    )
+    args = parser.parse_args()
+
+    summary = MonteCarlo(
+        args.runs,
+        args.seed,
+        period_length_days=args.days,
+        workers=args.workers,
+        reservation_factory=CapacityReservation.from_pool if args.reserve else None,
+    ).run()
+    print(json.dumps(summary, indent=2))
@@ -0,0 +1,277 @@
+import math
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from scheduling.appointments import Appointment
+from scheduling.calendar import AllocationError, MachineCalendar, NotEnoughDaysError
+from scheduling.constants import (
+    OPTIMIZER_DELAY_WEIGHT,
+    OPTIMIZER_MAX_DELAY_DAYS,
+    OPTIMIZER_PATIENCE,
+)
+from scheduling.diseases import CANCER_MAP
+from scheduling.machine_pool import MachinePool
+from scheduling.machines import BaseMachine
+from scheduling.slots import SlotError
+
+
+class OptimizationResult:
+    def __str__(self):
+        return (
+            f"{self.__class__.__name__}(iterations={self.iterations}, "
+            f"moves={self.moves}, improvement={self.improvement:.4f}, "
+            f"delay_days={self.delay_days})"
+        )
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __init__(
+        self,
+        iterations: int,
+        moves: int,
+        variance_before: float,
+        variance_after: float,
+        seconds: float,
+        delayed_courses: int = 0,
+        delay_days: int = 0,
+    ):
+        self.iterations = iterations
+        self.moves = moves
+        self.variance_before = variance_before
+        self.variance_after = variance_after
+        self.seconds = seconds
+        # courses starting later than booked, and their days of delay summed
+        self.delayed_courses = delayed_courses
+        self.delay_days = delay_days
+
+    @property
+    def improvement(self) -> float:
+        return self.variance_before - self.variance_after
+
+    def to_dict(self):
+        return {
+            "iterations": self.iterations,
+            "moves": self.moves,
+            "variance_before": round(self.variance_before, 4),
+            "variance_after": round(self.variance_after, 4),
+            "improvement": round(self.improvement, 4),
+            "delayed_courses": self.delayed_courses,
+            "delay_days": self.delay_days,
+            "seconds": round(self.seconds, 3),
+        }
+
+
+class Optimizer:
+    """Simulated annealing over appointments that haven't started yet.
+
+    A move rebooks one course on an eligible machine and shift, all of its
+    fraction days stay in a row and it never starts more than
+    ``max_delay_days`` later than it was booked. The objective is the
+    variance of the utilization across machines, averaged over the days up
+    to the latest end a course may move to, plus ``delay_weight`` times the
+    days every course starts later than booked. A weight of 1 prices a day
+    of delay like the variance one course adds on one day.
+
+    The calendar ends in the best state seen, accepted moves after it are
+    undone, and the search stops after ``patience`` iterations without a
+    new best. Works in place, run it on ``MachineCalendar.copy()`` to keep
+    the live calendar untouched.
+    """
+
+    CHECK_CLOCK_EVERY = 64
+
+    def __init__(
+        self,
+        machine_calendar: MachineCalendar,
+        machine_pool: MachinePool,
+        time_budget_seconds: float = 1.0,
+        seed: Optional[int] = None,
+        initial_temperature: Optional[float] = None,
+        max_delay_days: int = OPTIMIZER_MAX_DELAY_DAYS,
+        patience: int = OPTIMIZER_PATIENCE,
+        delay_weight: float = OPTIMIZER_DELAY_WEIGHT,
+    ):
+        self.calendar = machine_calendar
+        self.machine_pool = machine_pool
+        self.time_budget_seconds = time_budget_seconds
+        self.rng = random.Random(seed)
+        self.initial_temperature = initial_temperature
+        self.max_delay_days = max_delay_days
+        self.patience = patience
+        self.delay_weight = delay_weight
+
+        self._eligible: Dict[str, List[BaseMachine]] = {}
+
+    def horizon(self) -> int:
+        """Shifts up to the latest end a booked course may be moved to."""
+        end = max(
+            (self.calendar.shift_of(a) + a.days for a in self.calendar.ledger),
+            default=0,
+        )
+        return min(end + self.max_delay_days, self.calendar.calendar_length_days)
+
+    def variance(self, horizon: int) -> float:
+        if horizon <= 1:
+            return 0.0
+        return float(self.calendar.utilization_matrix(1, horizon).var(axis=0).mean())
+
+    def eligible_machines(self, appointment: Appointment) -> List[BaseMachine]:
+        if appointment.cancer_name not in self._eligible:
+            cancer = CANCER_MAP[appointment.cancer_name]()
+            self._eligible[appointment.cancer_name] = list(
+                self.machine_pool.select_machines(cancer)
+            )
+        return self._eligible[appointment.cancer_name]
+
+    def _spread(self, start: int, stop: int) -> float:
+        """Sum of the daily variances of used minutes across machines."""
+        used = self._day_length - self.calendar.free_minutes_matrix(
+            self._machines, stop, start
+        )
+        return float(used.var(axis=0).sum())
+
+    def _touched(
+        self, appointment: Appointment, shift: int
+    ) -> List[Tuple[int, int]]:
+        """Disjoint day ranges whose load changes when the appointment moves."""
+        old_shift = self.calendar.shift_of(appointment)
+        first, second = sorted((old_shift, shift))
+        if second <= first + appointment.days:
+            return [(first, second + appointment.days)]
+        return [(first, first + appointment.days), (second, second + appointment.days)]
+
+    def _propose(
+        self, appointment: Appointment, latest_shift: int
+    ) -> Optional[Tuple[BaseMachine, int]]:
+        machine = self.rng.choice(self.eligible_machines(appointment))
+        latest_shift = min(
+            latest_shift, self.calendar.calendar_length_days - appointment.days
+        )
+        if self.rng.random() < 0.5:
+            shift = self.rng.randint(1, latest_shift)
+        else:
+            shift = self.calendar[machine].first_fit(
+                appointment.days, appointment.allocated_time_minutes, 1, latest_shift + 1
+            )
+            if shift == -1:
+                return None
+        if machine is appointment.machine and shift == self.calendar.shift_of(
+            appointment
+        ):
+            return None
+        return machine, shift
+
+    def _eats_reserve(
+        self, appointment: Appointment, machine: BaseMachine, shift: int
+    ) -> bool:
+        """Whether a booked appointment left less than the reserve free."""
+        reservation = self.calendar.reservation
+        if reservation is None:
+            return False
+        if CANCER_MAP[appointment.cancer_name] in reservation.scarce:
+            return False
+        stop = shift + appointment.days
+        held = reservation.held_minutes([machine], self.calendar.current_day, stop)
+        free = self.calendar[machine].free_minutes(shift, stop)
+        return bool((free < held[0, shift:]).any())
+
+    def run(self) -> OptimizationResult:
+        started = time.perf_counter()
+        horizon = self.horizon()
+        variance_before = self.variance(horizon)
+
+        movable = [a for a in self.calendar.ledger if self.calendar.shift_of(a) > 0]
+        booked_shift = {a.appointment_id: self.calendar.shift_of(a) for a in movable}
+        self._machines = self.calendar.sorted_machines()
+        self._day_length = np.array(
+            [[self.calendar[machine].day_length_minutes] for machine in self._machines]
+        )
+        if not movable:
+            return OptimizationResult(
+                0, 0, variance_before, variance_before, time.perf_counter() - started
+            )
+
+        # on the scale of what one course adds to the objective
+        temperature = self.initial_temperature
+        if temperature is None:
+            temperature = float(
+                np.mean([a.allocated_time_minutes ** 2 * a.days for a in movable])
+            ) / len(self._machines)
+        # what one course adds to the spread on one day, per day of delay
+        delay_cost = (
+            self.delay_weight
+            * float(np.mean([a.allocated_time_minutes ** 2 for a in movable]))
+            / len(self._machines)
+        )
+
+        iterations, cooling = 0, 1.0
+        # objective relative to the start, and the moves accepted since the best
+        spread, best_spread, best_iteration = 0.0, 0.0, 0
+        undo: List[Tuple[int, BaseMachine, int, Optional[int]]] = []
+        moves = 0
+        while iterations - best_iteration < self.patience:
+            if iterations % self.CHECK_CLOCK_EVERY == 0:
+                elapsed = time.perf_counter() - started
+                if elapsed >= self.time_budget_seconds:
+                    break
+                # linear cooling, the last moments are a plain descent
+                cooling = 1 - elapsed / self.time_budget_seconds
+            iterations += 1
+
+            appointment = self.rng.choice(movable)
+            booked = booked_shift[appointment.appointment_id]
+            proposal = self._propose(appointment, booked + self.max_delay_days)
+            if proposal is None:
+                continue
+            machine, shift = proposal
+
+            old_machine = appointment.machine
+            old_shift = self.calendar.shift_of(appointment)
+            old_start_minute = appointment.start_minute
+            touched = self._touched(appointment, shift)
+            before = sum(self._spread(*days) for days in touched)
+            try:
+                self.calendar.move(appointment.appointment_id, machine, shift)
+            except (AllocationError, NotEnoughDaysError, SlotError):
+                continue
+            delta = sum(self._spread(*days) for days in touched) - before
+            delta += delay_cost * (max(shift - booked, 0) - max(old_shift - booked, 0))
+
+            accepted = not self._eats_reserve(appointment, machine, shift) and (
+                delta <= 0
+                or self.rng.random() < math.exp(-delta / (temperature * cooling + 1e-9))
+            )
+            if not accepted:
+                self.calendar.move(
+                    appointment.appointment_id, old_machine, old_shift, old_start_minute
+                )
+                continue
+            spread += delta
+            undo.append(
+                (appointment.appointment_id, old_machine, old_shift, old_start_minute)
+            )
+            if spread < best_spread - 1e-9:
+                moves += len(undo)
+                undo.clear()
+                best_spread, best_iteration = spread, iterations
+
+        # back to the best state, the moves since are undone newest first
+        for appointment_id, machine, shift, start_minute in reversed(undo):
+            self.calendar.move(appointment_id, machine, shift, start_minute)
+
+        delays = [
+            self.calendar.shift_of(a) - booked_shift[a.appointment_id] for a in movable
+        ]
+        return OptimizationResult(
+            iterations,
+            moves,
+            variance_before,
+            self.variance(horizon),
+            time.perf_counter() - started,
+            delayed_courses=sum(delay > 0 for delay in delays),
+            delay_days=sum(max(delay, 0) for delay in delays),
+        )
@@ -1,8 +1,8 @@
 import random
 import uuid
-from typing import Generator, List, Optional
+from typing import Generator, List, Optional, Type
 
-from faker import Faker
+import numpy as np
 
 from scheduling.diseases import Cancer, CANCER_MAP
 from scheduling.diseases import (
@@ -20,7 +20,30 @@ from scheduling.diseases import (
 from server.models import MakeAppointmentRequest
 
 
-_FAKER = Faker()
+_FAKER = None
+
+
+def get_faker():
+    """Faker is slow to import and set up, only load it once names are needed."""
+    global _FAKER
+    if _FAKER is None:
+        from faker import Faker
+
+        _FAKER = Faker()
+    return _FAKER
+
+
+NAME_POOL_SIZE = 1024
+_NAME_POOL: List[str] = []
+# names have their own random source, reading them mustn't shift patient draws
+_NAME_RANDOM = random.Random()
+
+
+def get_name_pool() -> List[str]:
+    """Fake names generated once and shared by every anonymous patient."""
+    if not _NAME_POOL:
+        _NAME_POOL.extend(str(get_faker().name()) for _ in range(NAME_POOL_SIZE))
+    return _NAME_POOL
 
 
 class InvalidFractionTime(Exception):
@@ -47,12 +70,23 @@ class Patient:
 
     def __init__(self, name: Optional[str], cancer: Cancer):
         super().__init__()
-        self.name = name or str(_FAKER.name())
+        self._name = name
         self.cancer = cancer
         self.fraction_time_days = None
 
-    def assign_random_fraction_time(self):
-        self.fraction_time_days = random.choice(self.cancer.fraction_time())
+    @property
+    def name(self) -> str:
+        if not self._name:
+            self._name = _NAME_RANDOM.choice(get_name_pool())
+        return self._name
+
+    @name.setter
+    def name(self, name: str):
+        self._name = name
+
+    def assign_random_fraction_time(self, rng: Optional[random.Random] = None):
+        rng = rng or random
+        self.fraction_time_days = rng.choice(self.cancer.fraction_time())
         return self.fraction_time_days
 
     @classmethod
@@ -66,6 +100,67 @@ class Patient:
         return patient
 
 
+class PatientBatch:
+    """Compact records of generated patients.
+
+    Cancer types, fraction times and names are kept as index arrays,
+    ``Patient`` objects are only built on access.
+    """
+
+    def __str__(self):
+        return f"{self.__class__.__name__}(size={len(self)})"
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __init__(
+        self,
+        cancers: List[Type[Cancer]],
+        cancer_index: np.ndarray,
+        fraction_time_days: np.ndarray,
+        name_index: np.ndarray,
+    ):
+        self.cancers = cancers
+        self.cancer_index = cancer_index
+        self.fraction_time_days = fraction_time_days
+        self.name_index = name_index
+
+    def __len__(self):
+        return len(self.cancer_index)
+
+    def __getitem__(self, item: int) -> Patient:
+        patient = Patient(
+            name=get_name_pool()[self.name_index[item]],
+            cancer=self.cancers[self.cancer_index[item]](),
+        )
+        patient.fraction_time_days = int(self.fraction_time_days[item])
+        return patient
+
+    def __iter__(self):
+        for item in range(len(self)):
+            yield self[item]
+
+    def treatment_time_minutes(self) -> np.ndarray:
+        minutes = np.array([cancer.treatment_time_minutes() for cancer in self.cancers])
+        return minutes[self.cancer_index]
+
+    def to_dicts(self) -> List[dict]:
+        cancers = [cancer.to_dict() for cancer in self.cancers]
+        names = get_name_pool()
+        return [
+            {
+                "name": names[name],
+                "fraction_time_days": int(fraction_time),
+                "cancer": cancers[cancer],
+            }
+            for cancer, fraction_time, name in zip(
+                self.cancer_index.tolist(),
+                self.fraction_time_days.tolist(),
+                self.name_index.tolist(),
+            )
+        ]
+
+
 class PatientGen:
 
     cancers = [
@@ -81,9 +176,45 @@ class PatientGen:
         WholeBrain,
     ]
 
+    def __init__(self, rng: Optional[random.Random] = None):
+        self.rng = rng or random
+
     def get_patient(self) -> Generator[Patient, None, None]:
+        weights = [cancer.probability() for cancer in self.cancers]
         while True:
-            cancer = random.choices(
-                self.cancers, weights=[cancer.probability() for cancer in self.cancers]
-            )[0]
+            cancer = self.rng.choices(self.cancers, weights=weights)[0]
             yield Patient(name=None, cancer=cancer())
+
+    def get_batch(
+        self, size: int, rng: Optional[np.random.Generator] = None
+    ) -> PatientBatch:
+        """Draw ``size`` patients with prescribed fraction times at once.
+
+        Without ``rng`` the batch is seeded from the generator's own random
+        source, so seeded generators stay reproducible.
+        """
+        rng = rng or np.random.default_rng(self.rng.getrandbits(64))
+
+        probabilities = np.array([cancer.probability() for cancer in self.cancers])
+        fraction_counts = np.array(
+            [len(cancer.fraction_time()) for cancer in self.cancers]
+        )
+        fraction_table = np.zeros(
+            (len(self.cancers), fraction_counts.max()), dtype=np.int16
+        )
+        for row, cancer in enumerate(self.cancers):
+            fraction_table[row, : fraction_counts[row]] = cancer.fraction_time()
+
+        cancer_index = rng.choice(
+            len(self.cancers), size=size, p=probabilities / probabilities.sum()
+        ).astype(np.int8)
+        fraction_index = (
+            rng.random(size) * fraction_counts[cancer_index]
+        ).astype(np.int64)
+
+        return PatientBatch(
+            cancers=list(self.cancers),
+            cancer_index=cancer_index,
+            fraction_time_days=fraction_table[cancer_index, fraction_index],
+            name_index=rng.integers(0, NAME_POOL_SIZE, size=size, dtype=np.int32),
+        )
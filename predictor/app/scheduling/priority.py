@@ -1,8 +1,26 @@
-from typing import List
+from typing import List, TYPE_CHECKING
 
 from scheduling.calendar import MachineCalendar, Period
+from scheduling.constants import (
+    ORDER_ARRIVAL,
+    ORDER_LONGEST_FRACTION_FIRST,
+    ORDER_MOST_CONSTRAINED_FIRST,
+    BATCH_ORDERINGS,
+)
 from scheduling.machines import BaseMachine
 
+if TYPE_CHECKING:
+    from scheduling.machine_pool import MachinePool
+    from scheduling.patients import Patient
+
+
+class InvalidOrdering(Exception):
+    def __init__(self, ordering: str):
+        super().__init__(
+            f"Ordering {ordering} is invalid. "
+            f"Available orderings: [ {', '.join(BATCH_ORDERINGS)} ]"
+        )
+
 
 class MachinePriority:
     """Priority allocator.
@@ -25,3 +43,37 @@ class MachinePriority:
             key=lambda machine: machine_calendar[machine].load_level(),
             reverse=True,
         )
+
+
+class PatientPriority:
+    """Batch ordering.
+
+    Decide in which order a batch of patients is placed. Sorting is stable,
+    so patients with equal priority keep their arrival order.
+    """
+
+    @classmethod
+    def order(
+        cls,
+        patients: List["Patient"],
+        machine_pool: "MachinePool",
+        ordering: str = ORDER_ARRIVAL,
+    ) -> List[int]:
+        """Positions of ``patients`` in the order they should be placed."""
+        positions = list(range(len(patients)))
+
+        if ordering == ORDER_ARRIVAL:
+            return positions
+
+        if ordering == ORDER_LONGEST_FRACTION_FIRST:
+            return sorted(
+                positions, key=lambda i: patients[i].fraction_time_days, reverse=True
+            )
+
+        if ordering == ORDER_MOST_CONSTRAINED_FIRST:
+            return sorted(
+                positions,
+                key=lambda i: len(machine_pool.select_machines(patients[i].cancer)),
+            )
+
+        raise InvalidOrdering(ordering)
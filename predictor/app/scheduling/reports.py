@@ -0,0 +1,202 @@
+import csv
+import io
+import json
+import zlib
+from typing import TYPE_CHECKING, Dict, Generator, Iterable, List
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from prettytable import PrettyTable
+
+    from scheduling.calendar import MachineCalendar
+
+FORMAT_HTML = "html"
+FORMAT_JSONL = "jsonl"
+FORMAT_CSV = "csv"
+FORMAT_COLUMNAR = "columnar"
+
+REPORT_FORMATS = [FORMAT_HTML, FORMAT_JSONL, FORMAT_CSV, FORMAT_COLUMNAR]
+
+MEDIA_TYPES = {
+    FORMAT_HTML: "text/html",
+    FORMAT_JSONL: "application/x-ndjson",
+    FORMAT_CSV: "text/csv",
+    FORMAT_COLUMNAR: "application/json",
+}
+
+COMPRESSION_NONE = "none"
+COMPRESSION_GZIP = "gzip"
+
+REPORT_COMPRESSIONS = [COMPRESSION_NONE, COMPRESSION_GZIP]
+
+CHUNK_ROWS = 256
+
+
+class InvalidReportFormat(Exception):
+    def __init__(self, report_format: str):
+        super().__init__(
+            f"Report format {report_format} is invalid. "
+            f"Available formats: [ {', '.join(REPORT_FORMATS)} ]"
+        )
+
+
+class InvalidReportCompression(Exception):
+    def __init__(self, compression: str):
+        super().__init__(
+            f"Compression {compression} is invalid. "
+            f"Available compressions: [ {', '.join(REPORT_COMPRESSIONS)} ]"
+        )
+
+
+def gzip_stream(chunks: Iterable[str]) -> Generator[bytes, None, None]:
+    """Gzip text chunks on the fly."""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk.encode())
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class UtilizationReport:
+    """Per day and per machine utilization, computed in one vectorized pass.
+
+    Renderers stream the matrix in chunks of rows, HTML is just one of them.
+    """
+
+    def __str__(self):
+        return (
+            f"{self.__class__.__name__}"
+            f"(days={len(self.days)}, machines={self.machine_names})"
+        )
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __init__(
+        self, machine_names: List[str], days: np.ndarray, utilization: np.ndarray
+    ):
+        self.machine_names = machine_names
+        self.days = days
+        # (days x machines) used share in percents
+        self.utilization = utilization
+        if utilization.shape[1]:
+            self.average = utilization.mean(axis=1)
+        else:
+            self.average = np.zeros(len(days))
+
+    @classmethod
+    def from_calendar(
+        cls, machine_calendar: "MachineCalendar", start_day: int, end_day: int
+    ) -> "UtilizationReport":
+        end_day = max(min(end_day, machine_calendar.calendar_length_days), 0)
+        start_day = min(max(start_day, 0), end_day)
+        machines = machine_calendar.sorted_machines()
+        return cls(
+            machine_names=[machine.name() for machine in machines],
+            # just for managers, they don't like leading zero
+            days=np.arange(start_day, end_day) + 1,
+            utilization=machine_calendar.utilization_matrix(
+                start_day, end_day, machines
+            ).T,
+        )
+
+    @property
+    def field_names(self) -> List[str]:
+        return ["day"] + self.machine_names + ["average"]
+
+    def _rounded(self, start: int, stop: int):
+        return (
+            self.days[start:stop].tolist(),
+            np.round(self.utilization[start:stop], 2).tolist(),
+            np.round(self.average[start:stop], 2).tolist(),
+        )
+
+    def iter_row_chunks(self) -> Generator[List[list], None, None]:
+        for start in range(0, len(self.days), CHUNK_ROWS):
+            days, utilization, average = self._rounded(start, start + CHUNK_ROWS)
+            yield [
+                [day] + machines + [day_average]
+                for day, machines, day_average in zip(days, utilization, average)
+            ]
+
+    def iter_rows(self) -> Generator[Dict, None, None]:
+        field_names = self.field_names
+        for chunk in self.iter_row_chunks():
+            for row in chunk:
+                yield dict(zip(field_names, row))
+
+    def iter_jsonl(self) -> Generator[str, None, None]:
+        field_names = self.field_names
+        for chunk in self.iter_row_chunks():
+            yield "".join(
+                json.dumps(dict(zip(field_names, row))) + "\n" for row in chunk
+            )
+
+    def iter_csv(self) -> Generator[str, None, None]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self.field_names)
+        for chunk in self.iter_row_chunks():
+            writer.writerows(chunk)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    def iter_columnar(self) -> Generator[str, None, None]:
+        """One JSON object with a list of values per column."""
+        columns = [self.days]
+        columns += [self.utilization[:, i] for i in range(len(self.machine_names))]
+        columns += [self.average]
+
+        yield "{"
+        for position, (name, column) in enumerate(zip(self.field_names, columns)):
+            if position:
+                yield ", "
+            values = column.tolist() if name == "day" else np.round(column, 2).tolist()
+            yield f"{json.dumps(name)}: {json.dumps(values)}"
+        yield "}"
+
+    def to_table(self) -> "PrettyTable":
+        from prettytable import PrettyTable
+
+        table = PrettyTable()
+        table.title = "Utilization report"
+        table.field_names = ["Day"] + self.machine_names + ["Average"]
+        for chunk in self.iter_row_chunks():
+            table.add_rows(
+                [[row[0]] + [f"{value}%" for value in row[1:]] for row in chunk]
+            )
+        return table
+
+    def iter_html(self) -> Generator[str, None, None]:
+        yield self.to_table().get_html_string(
+            preserve_internal_border=True,
+            attributes={
+                "border": "1 px",
+                "cellpadding": "15 px",
+                "align": "center",
+            },
+        )
+
+    def render(
+        self, report_format: str = FORMAT_HTML, compression: str = COMPRESSION_NONE
+    ):
+        renderers = {
+            FORMAT_HTML: self.iter_html,
+            FORMAT_JSONL: self.iter_jsonl,
+            FORMAT_CSV: self.iter_csv,
+            FORMAT_COLUMNAR: self.iter_columnar,
+        }
+        if report_format not in renderers:
+            raise InvalidReportFormat(report_format)
+        if compression not in REPORT_COMPRESSIONS:
+            raise InvalidReportCompression(compression)
+
+        chunks = renderers[report_format]()
+        if compression == COMPRESSION_GZIP:
+            return gzip_stream(chunks)
+        return chunks
@@ -0,0 +1,254 @@
+import threading
+from typing import Dict, FrozenSet, List, Optional, Type
+
+import numpy as np
+
+from scheduling.constants import DAY_LENGTH_MINUTES, YEAR_LEN_DAYS
+from scheduling.diseases import Cancer, CANCER_MAP
+from scheduling.locks import LockState
+from scheduling.machine_pool import MachinePool
+from scheduling.machines import BaseMachine
+
+# cancers that only this share of the fleet or less can treat are scarce
+SCARCE_SHARE = 0.6
+
+
+def expected_daily_minutes(cancer: Type[Cancer]) -> float:
+    """Minutes a day one arriving patient of ``cancer`` keeps busy on average.
+
+    Fraction times are drawn uniformly from the prescribed ones.
+    """
+    return (
+        cancer.probability()
+        * float(np.mean(cancer.fraction_time()))
+        * cancer.treatment_time_minutes()
+    )
+
+
+class CapacityReservation(LockState):
+    """Minutes held back every day on machines that treat scarce cancers.
+
+    With ``patients_per_day`` arrivals a day, a scarce cancer keeps
+    ``patients_per_day * probability * mean fraction time * treatment time``
+    minutes a day busy once courses overlap in steady state. That load is
+    split evenly over the machines able to treat it and held back from
+    every other patient. Scarce patients see the whole day and use the
+    reserve of the days they are booked on up first.
+
+    Shifts closer than ``release_within_days`` are released to everyone,
+    scarce patients that late would not arrive in time to use them.
+    ``release`` drops the reserve of a machine or of the whole fleet.
+    """
+
+    def __str__(self):
+        scarce = ", ".join(sorted(cancer.name() for cancer in self.scarce))
+        return f"{self.__class__.__name__}(scarce=[{scarce}])"
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __init__(
+        self,
+        reserved_minutes: Dict[BaseMachine, int],
+        scarce: FrozenSet[Type[Cancer]],
+        release_within_days: int = 0,
+    ):
+        self.reserved_minutes = reserved_minutes
+        self.scarce = scarce
+        self.release_within_days = release_within_days
+        self._released = set()
+        # scarce minutes booked per machine, indexed by calendar day
+        self._consumed: Dict[BaseMachine, np.ndarray] = {
+            machine: np.zeros(0, dtype=np.int32) for machine in reserved_minutes
+        }
+        # concurrent bookings update the consumed minutes
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_pool(
+        cls,
+        machine_pool: MachinePool,
+        patients_per_day: Optional[float] = None,
+        scarce_share: float = SCARCE_SHARE,
+        headroom: float = 1.0,
+        release_within_days: int = 0,
+    ) -> "CapacityReservation":
+        """Reserve for the pool's scarce cancers.
+
+        Without ``patients_per_day`` the arrival rate is the one that keeps
+        the whole fleet busy with the ``PatientGen`` mix.
+        """
+        machines = machine_pool.get_all_machines()
+        if patients_per_day is None:
+            patients_per_day = (
+                len(machines)
+                * DAY_LENGTH_MINUTES
+                / sum(expected_daily_minutes(cancer) for cancer in CANCER_MAP.values())
+            )
+
+        reserved = {machine: 0.0 for machine in machines}
+        scarce = set()
+        for cancer in CANCER_MAP.values():
+            eligible = machine_pool.select_machines(cancer())
+            if not eligible or len(eligible) / len(machines) > scarce_share:
+                continue
+            scarce.add(cancer)
+            minutes = patients_per_day * expected_daily_minutes(cancer) * headroom
+            for machine in eligible:
+                reserved[machine] += minutes / len(eligible)
+
+        return cls(
+            {machine: int(round(minutes)) for machine, minutes in reserved.items()},
+            frozenset(scarce),
+            release_within_days,
+        )
+
+    def is_exempt(self, cancer: Cancer) -> bool:
+        return cancer.__class__ in self.scarce
+
+    def release(self, machine: Optional[BaseMachine] = None):
+        """Give the reserve of ``machine``, or of every machine, back to everyone."""
+        self._released.update([machine] if machine else self.reserved_minutes)
+        return self
+
+    def hold(self, machine: Optional[BaseMachine] = None):
+        """Undo ``release``."""
+        if machine:
+            self._released.discard(machine)
+        else:
+            self._released.clear()
+        return self
+
+    def reserved(self, machine: BaseMachine) -> int:
+        if machine in self._released:
+            return 0
+        return self.reserved_minutes.get(machine, 0)
+
+    def _consumed_days(self, machine: BaseMachine, stop_day: int) -> np.ndarray:
+        consumed = self._consumed[machine]
+        if len(consumed) < stop_day:
+            grown = np.zeros(max(stop_day, 2 * len(consumed)), dtype=np.int32)
+            grown[: len(consumed)] = consumed
+            consumed = self._consumed[machine] = grown
+        return consumed
+
+    def consume(
+        self,
+        machine: BaseMachine,
+        cancer_name: str,
+        start_day: int,
+        days: int,
+        minutes: int,
+    ):
+        """Count a booking from calendar day ``start_day`` against the reserve."""
+        if machine in self._consumed and CANCER_MAP[cancer_name] in self.scarce:
+            with self.lock:
+                self._consumed_days(machine, start_day + days)[
+                    start_day : start_day + days
+                ] += minutes
+
+    def give_back(
+        self,
+        machine: BaseMachine,
+        cancer_name: str,
+        start_day: int,
+        days: int,
+        minutes: int,
+    ):
+        if machine in self._consumed and CANCER_MAP[cancer_name] in self.scarce:
+            with self.lock:
+                self._consumed_days(machine, start_day + days)[
+                    start_day : start_day + days
+                ] -= minutes
+
+    def held_minutes(
+        self, machines: List[BaseMachine], current_day: int, days: int
+    ) -> np.ndarray:
+        """Minutes still held back on shifts [0, days), shape (machines x days)."""
+        held = np.zeros((len(machines), days), dtype=np.int32)
+        for row, machine in enumerate(machines):
+            reserved = self.reserved(machine)
+            if not reserved:
+                continue
+            with self.lock:
+                consumed = self._consumed_days(machine, current_day + days)[
+                    current_day : current_day + days
+                ]
+            np.maximum(reserved - consumed, 0, out=held[row])
+        held[:, : self.release_within_days] = 0
+        return held
+
+    def to_dict(self):
+        return {
+            "scarce": sorted(cancer.name() for cancer in self.scarce),
+            "reserved_minutes": {
+                machine.name(): self.reserved(machine)
+                for machine in sorted(
+                    self.reserved_minutes, key=lambda machine: machine.name()
+                )
+            },
+            "release_within_days": self.release_within_days,
+        }
+
+
+def compare_throughput(
+    runs: int,
+    master_seed: int = 0,
+    period_length_days: int = YEAR_LEN_DAYS,
+    max_patients: Optional[int] = None,
+    workers: Optional[int] = None,
+) -> Dict:
+    """Monte Carlo runs with and without the reserve on the same patient streams.
+
+    Without ``max_patients`` every run stops at the first rejection, so
+    ``patients_placed`` is the throughput until the calendar is full.
+    """
+    from scheduling.monte_carlo import MonteCarlo
+
+    summaries = {}
+    for name, reservation_factory in (
+        ("greedy", None),
+        ("reserved", CapacityReservation.from_pool),
+    ):
+        summaries[name] = MonteCarlo(
+            runs,
+            master_seed,
+            period_length_days=period_length_days,
+            max_patients=max_patients,
+            stop_on_rejection=max_patients is None,
+            workers=workers,
+            reservation_factory=reservation_factory,
+        ).run()
+
+    greedy, reserved = summaries["greedy"], summaries["reserved"]
+    summaries["patients_placed_gain"] = (
+        reserved["patients_placed"]["mean"] - greedy["patients_placed"]["mean"]
+    )
+    summaries["placed_by_cancer_gain"] = {
+        cancer: reserved["placed_by_cancer"].get(cancer, {}).get("mean", 0.0)
+        - greedy["placed_by_cancer"].get(cancer, {}).get("mean", 0.0)
+        for cancer in sorted(
+            {*greedy["placed_by_cancer"], *reserved["placed_by_cancer"]}
+        )
+    }
+    return summaries
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(
+        description="Throughput with and without capacity reservation"
+    )
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--days", type=int, default=YEAR_LEN_DAYS)
+    parser.add_argument("--patients", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    summary = compare_throughput(
+        args.runs, args.seed, args.days, args.patients, args.workers
+    )
+    print(json.dumps(summary, indent=2))
@@ -1,16 +1,30 @@
-import sys
-from typing import Optional, List
+import logging
+import time
+from itertools import count
+from typing import Optional, List, Tuple
 
-from matplotlib import pyplot as plt
-from prettytable import PrettyTable
 
-from scheduling.priority import MachinePriority
+from scheduling.appointments import Appointment
+from scheduling.constants import ORDER_ARRIVAL
+from scheduling.priority import MachinePriority, PatientPriority
 
 from scheduling.diseases import Cancer
+from scheduling.earliest_fit import EarliestFit
 from scheduling.machines import BaseMachine
-from scheduling.patients import PatientGen
-from scheduling.calendar import Period, MachineCalendar
+from scheduling.patients import Patient, PatientGen
+from scheduling.slots import SlotError
+from scheduling.calendar import AllocationError, MachineCalendar
 from scheduling.machine_pool import MachinePool
+from scheduling.metrics import (
+    COMMIT_CONFLICTS,
+    EXTEND_SCHEDULE_ERRORS,
+    MACHINES_TRIED,
+    PLACEMENT_SECONDS,
+    SHIFTS_SCANNED,
+    SHIFTS_SKIPPED,
+)
+
+logger = logging.getLogger(__name__)
 
 
 class ExtendScheduleError(Exception):
@@ -20,6 +34,8 @@ class ExtendScheduleError(Exception):
 
 class Scheduler:
     DRAW_SLEEP = 0.00001
+    # one in this many late placements is logged
+    LOG_SAMPLE_EVERY = 100
 
     def __init__(
         self,
@@ -36,51 +52,33 @@ class Scheduler:
             else machine_calendar
         )
         self.patient_generator = patient_generator
+        self._late_placements = count()
 
     def schedule(self):
         """Schedule appointments."""
-        plt.ion()
-        fig, ax = plt.subplots()
-
-        for patient in self.patient_generator.get_patient():
-            ax.clear()
-
-            try:
-                patient.assign_random_fraction_time()
-                self.process_patient(patient, print_report=True)
-            except ExtendScheduleError:
-                table = self.calendar.get_report_data()
-                print(table)
-                return
-
-            self.calendar.visualize(ax)
-            plt.pause(self.DRAW_SLEEP)
-            plt.draw()
+        from scheduling.simulation import Simulation, PrintReportHook, VisualizeHook
 
-    @staticmethod
-    def allocate_segment(period: Period, cancer: Cancer, days: int, shift: int) -> bool:
-        if period.can_allocate(days, cancer.treatment_time_minutes(), shift):
-            period.allocate(days, cancer.treatment_time_minutes(), shift)
-            return True
-        return False
+        Simulation(
+            self,
+            hooks=[
+                PrintReportHook(self.calendar),
+                VisualizeHook(self.calendar, self.DRAW_SLEEP),
+            ],
+        ).run()
 
-    def get_machine(
+    def simulate(
         self,
-        cancer: Cancer,
-        days: int,
-        shift: int = 0,
-    ) -> Optional[BaseMachine]:
-
-        machines = self.machine_pool.select_machines(cancer)
-        balancer = MachinePriority()
-        balanced_machines = balancer.get_balanced(self.calendar, machines)
-
-        for machine in balanced_machines:
-            period = self.calendar[machine]
-            allocated = self.allocate_segment(period, cancer, days, shift)
-            if allocated:
-                return machine
-        return None
+        max_patients: Optional[int] = None,
+        max_day: Optional[int] = None,
+        hooks=None,
+        stop_on_rejection: bool = True,
+    ):
+        """Run the patient generator headless and return summary statistics."""
+        from scheduling.simulation import Simulation
+
+        return Simulation(
+            self, max_patients, max_day, hooks, stop_on_rejection
+        ).run()
 
     @staticmethod
     def print_report(
@@ -89,6 +87,8 @@ class Scheduler:
         shift,
         cancer,
     ):
+        from prettytable import PrettyTable
+
         table = PrettyTable(field_names=["Field", "Value"], align="r")
         table.add_rows(
             [
@@ -101,23 +101,93 @@ class Scheduler:
         )
         print(table)
 
-    def process_patient(self, patient, print_report=False):
+    def find_placement(
+        self, cancer: Cancer, machines: List[BaseMachine], days: int, minutes: int
+    ) -> Optional[Tuple[BaseMachine, int, Optional[int]]]:
+        """Earliest (machine, shift, start minute), the minute is None unless slotted.
+
+        Minutes reserved for scarce cancers are off limits to other patients.
+        """
+        horizon = self.period_length_days - days
+        MACHINES_TRIED.inc(len(machines))
+        held = None
+        reservation = self.calendar.reservation
+        if reservation is not None and not reservation.is_exempt(cancer):
+            held = reservation.held_minutes(
+                machines, self.calendar.current_day, self.calendar.calendar_length_days
+            )
+        if self.calendar.slotted:
+            placement = EarliestFit.find_slot(
+                self.calendar, machines, days, minutes, horizon, held
+            )
+        else:
+            placement = EarliestFit.find(
+                self.calendar, machines, days, minutes, horizon, held
+            )
+            if placement is not None:
+                placement = (*placement, None)
+
+        SHIFTS_SCANNED.inc(placement[1] + 1 if placement else max(horizon, 0))
+        return placement
+
+    def book_patient(self, patient, print_report=False) -> Appointment:
+        started = time.perf_counter()
         days = patient.fraction_time_days  # length of the sliding window
         cancer = patient.cancer
 
-        machine = None
-        final_shift = -1
-        for shift in range(self.period_length_days - days):
-            machine = self.get_machine(cancer, days, shift)
-            if machine:
-                final_shift = 0
-                if print_report:
-                    self.print_report(machine, days, shift, cancer)
-                break
-            else:
-                print(f"No suitable machine for shift {shift}")
-
-        if not machine:
-            raise ExtendScheduleError
-
-        return machine, final_shift
+        machines = MachinePriority.get_balanced(
+            self.calendar, self.machine_pool.select_machines(cancer)
+        )
+        minutes = cancer.treatment_time_minutes()
+        appointment = None
+        while appointment is None:
+            # held shared, so the calendar can't grow or advance under the search
+            with self.calendar.lock.shared():
+                placement = self.find_placement(cancer, machines, days, minutes)
+                if placement:
+                    machine, shift, start_minute = placement
+                    try:
+                        appointment = self.calendar.book(
+                            patient, machine, shift, days, minutes, start_minute
+                        )
+                    except (AllocationError, SlotError):
+                        # a concurrent booking took the window, search again
+                        COMMIT_CONFLICTS.inc()
+                    continue
+            if not self.calendar.grow(self.period_length_days + days):
+                EXTEND_SCHEDULE_ERRORS.inc(cancer=cancer.name())
+                raise ExtendScheduleError
+            # the search horizon follows the calendar
+            self.period_length_days = self.calendar.calendar_length_days
+        PLACEMENT_SECONDS.observe(time.perf_counter() - started)
+        if shift:
+            SHIFTS_SKIPPED.inc(shift)
+            if (
+                logger.isEnabledFor(logging.DEBUG)
+                and next(self._late_placements) % self.LOG_SAMPLE_EVERY == 0
+            ):
+                logger.debug("No suitable machine before shift %d", shift)
+        if print_report:
+            self.print_report(machine, days, shift, cancer)
+
+        return appointment
+
+    def process_patient(self, patient, print_report=False):
+        appointment = self.book_patient(patient, print_report)
+        return appointment.machine, self.calendar.shift_of(appointment)
+
+    def process_batch(
+        self, patients: List[Patient], ordering: str = ORDER_ARRIVAL
+    ) -> List[Optional[Appointment]]:
+        """Place a batch of patients on the shared calendar.
+
+        Results follow the order of ``patients``, ``None`` marks a patient
+        that doesn't fit into the schedule.
+        """
+        appointments = [None] * len(patients)
+        for position in PatientPriority.order(patients, self.machine_pool, ordering):
+            try:
+                appointments[position] = self.book_patient(patients[position])
+            except ExtendScheduleError:
+                continue
+        return appointments
@@ -0,0 +1,212 @@
+import fcntl
+import os
+import threading
+from contextlib import contextmanager
+from typing import BinaryIO
+
+import numpy as np
+
+from scheduling.calendar import MachineCalendar, Period
+from scheduling.locks import SharedLock
+from scheduling.machine_pool import MachinePool
+from scheduling.storage import CalendarFile
+
+# byte of the file locked by calendar-wide changes, machine rows follow
+CALENDAR_LOCK_BYTE = 0
+
+
+class FileMutex:
+    """Mutex over threads and processes, a ``lockf`` lock on one byte of a file.
+
+    Record locks belong to the process, the thread lock keeps two threads
+    of one process from sharing it.
+    """
+
+    def __init__(self, file: BinaryIO, offset: int):
+        self._file = file
+        self._offset = offset
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            fcntl.lockf(self._file, fcntl.LOCK_EX, 1, self._offset)
+        except BaseException:
+            self._lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        fcntl.lockf(self._file, fcntl.LOCK_UN, 1, self._offset)
+        self._lock.release()
+
+
+class FileSharedLock:
+    """``SharedLock`` that also excludes other processes.
+
+    The first shared holder of the process takes a shared ``lockf`` lock,
+    the last one gives it back; exclusive holders take an exclusive one.
+    Nested holds of the exclusive holder leave the ``lockf`` lock alone,
+    taking it again would downgrade or drop it.
+    """
+
+    def __init__(self, file: BinaryIO, offset: int):
+        self._file = file
+        self._offset = offset
+        self._local = SharedLock()
+        self._holders = 0
+        self._holders_lock = threading.Lock()
+
+    def held_exclusive(self) -> bool:
+        return self._local.held_exclusive()
+
+    @contextmanager
+    def shared(self):
+        if self.held_exclusive():
+            yield
+            return
+        with self._local.shared():
+            with self._holders_lock:
+                if not self._holders:
+                    fcntl.lockf(self._file, fcntl.LOCK_SH, 1, self._offset)
+                self._holders += 1
+            try:
+                yield
+            finally:
+                with self._holders_lock:
+                    self._holders -= 1
+                    if not self._holders:
+                        fcntl.lockf(self._file, fcntl.LOCK_UN, 1, self._offset)
+
+    @contextmanager
+    def exclusive(self):
+        if self.held_exclusive():
+            yield
+            return
+        with self._local.exclusive():
+            fcntl.lockf(self._file, fcntl.LOCK_EX, 1, self._offset)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._file, fcntl.LOCK_UN, 1, self._offset)
+
+
+def _shared_field(name: str) -> property:
+    def get(self) -> int:
+        return int(self._record[name][0])
+
+    def set(self, value: int):
+        self._record[name] = value
+
+    return property(get, set)
+
+
+class SharedPeriod(Period):
+    """Period whose minutes, ring state and totals live in a shared file.
+
+    Every process mapping the file sees the changes of the others, and
+    changes lock the machine's row across processes. The horizon is fixed,
+    an index or slots would go stale in the other processes.
+    """
+
+    _origin = _shared_field("origin")
+    day_offset = _shared_field("day_offset")
+    _free_minutes_total = _shared_field("free_minutes_total")
+    _busy_days = _shared_field("busy_days")
+    version = _shared_field("version")
+
+    # the ring state already lives in the file, so Period.__init__ isn't run
+    def __init__(
+        self, time_left: np.ndarray, record: np.ndarray, day_length_minutes: int, lock
+    ):
+        self.period_length_days = len(time_left)
+        self.day_length_minutes = day_length_minutes
+        self._time_left = time_left
+        self._record = record
+        self._index = None
+        self.slots = None
+        self._largest_gap = None
+        self.lock = lock
+
+    def overwrite(self, period: Period):
+        """Take over the minutes of ``period``, e.g. an optimized copy."""
+        with self.lock:
+            self._time_left[:] = period.free_minutes()
+            self._origin = 0
+            self.day_offset = period.day_offset
+            self._free_minutes_total = period.free_minutes_total
+            self._busy_days = period.busy_days
+            self.version += 1
+
+
+class SharedMachineCalendar(MachineCalendar):
+    """Calendar shared by every process that opens the same file.
+
+    Placements lock the calendar shared and the machine's row exclusive
+    across processes, so workers never double-book a window; ``advance``
+    and ``replace`` lock the whole calendar. The ledger stays per process.
+    """
+
+    # the other processes' bookings mustn't wait for a whole pass
+    batch_locking = False
+
+    def __init__(self, machine_pool: MachinePool, calendar_file: CalendarFile):
+        # keeps MachineCalendar.__init__ from resetting the shared current day
+        self.storage = None
+        length = calendar_file.matrix.shape[1]
+        super().__init__(machine_pool, length, max_calendar_length_days=length)
+        self.storage = calendar_file
+        self.lock = FileSharedLock(calendar_file.file, CALENDAR_LOCK_BYTE)
+
+        for row, machine in enumerate(calendar_file.check_machines(self)):
+            self.calendar[machine] = SharedPeriod(
+                calendar_file.matrix[row],
+                calendar_file.machines[row : row + 1],
+                self.calendar[machine].day_length_minutes,
+                FileMutex(calendar_file.file, CALENDAR_LOCK_BYTE + 1 + row),
+            )
+
+    @property
+    def current_day(self) -> int:
+        if self.storage is None:  # an in-memory copy
+            return self._current_day
+        return int(self.storage.header["current_day"][0])
+
+    @current_day.setter
+    def current_day(self, current_day: int):
+        if self.storage is None:
+            self._current_day = current_day
+        else:
+            self.storage.header["current_day"] = current_day
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state["_current_day"] = self.current_day
+        return state
+
+    def replace(self, other: MachineCalendar, expected_version: int) -> bool:
+        """Copy the minutes of ``other`` into the file if at ``expected_version``."""
+        with self.lock.exclusive():
+            if self.version != expected_version:
+                return False
+            for machine, period in self.calendar.items():
+                period.overwrite(other[machine])
+            self.ledger = other.ledger
+            return True
+
+
+def open_shared_calendar(
+    path: str, machine_pool: MachinePool, calendar_length_days: int
+) -> SharedMachineCalendar:
+    """Open the calendar at ``path``, the first process creates it.
+
+    Its horizon is fixed to ``calendar_length_days`` at creation, growing
+    would move the file under the other processes.
+    """
+    with open(f"{path}.lock", "a") as creation_lock:
+        fcntl.lockf(creation_lock, fcntl.LOCK_EX)
+        if not os.path.exists(path):
+            CalendarFile.create(
+                path, MachineCalendar(machine_pool, calendar_length_days)
+            )
+    return SharedMachineCalendar(machine_pool, CalendarFile.open(path))
@@ -0,0 +1,231 @@
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from scheduling.calendar import MachineCalendar
+from scheduling.machines import BaseMachine
+from scheduling.patients import Patient
+from scheduling.scheduler import Scheduler, ExtendScheduleError
+
+STOP_EXTEND_SCHEDULE = "extend_schedule"
+STOP_PATIENT_BUDGET = "patient_budget"
+STOP_DAY_BUDGET = "day_budget"
+STOP_GENERATOR_EXHAUSTED = "generator_exhausted"
+
+
+class SimulationHook:
+    """Callbacks around a simulation run, every method is optional."""
+
+    def on_start(self, simulation: "Simulation"):
+        pass
+
+    def on_placement(self, patient: Patient, machine: BaseMachine, shift: int):
+        pass
+
+    def on_finish(self, result: "SimulationResult"):
+        pass
+
+
+class PrintReportHook(SimulationHook):
+    """Print every placement and the utilization report at the end."""
+
+    def __init__(self, machine_calendar: MachineCalendar):
+        self.machine_calendar = machine_calendar
+
+    def on_placement(self, patient: Patient, machine: BaseMachine, shift: int):
+        Scheduler.print_report(
+            machine, patient.fraction_time_days, shift, patient.cancer
+        )
+
+    def on_finish(self, result: "SimulationResult"):
+        print(self.machine_calendar.get_report_data())
+
+
+class VisualizeHook(SimulationHook):
+    """Redraw the calendar bar chart after every placement."""
+
+    def __init__(self, machine_calendar: MachineCalendar, draw_sleep: float):
+        self.machine_calendar = machine_calendar
+        self.draw_sleep = draw_sleep
+        self._ax = None
+
+    def on_start(self, simulation: "Simulation"):
+        from matplotlib import pyplot as plt
+
+        plt.ion()
+        _, self._ax = plt.subplots()
+
+    def on_placement(self, patient: Patient, machine: BaseMachine, shift: int):
+        from matplotlib import pyplot as plt
+
+        self._ax.clear()
+        self.machine_calendar.visualize(self._ax)
+        plt.pause(self.draw_sleep)
+        plt.draw()
+
+
+class SimulationResult:
+    def __str__(self):
+        return (
+            f"{self.__class__.__name__}(patients_placed={self.patients_placed}, "
+            f"stop_reason={self.stop_reason})"
+        )
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __init__(
+        self,
+        patients_placed: int,
+        patients_rejected: int,
+        shifts: List[int],
+        placement_seconds: List[float],
+        wall_time_seconds: float,
+        utilization: Dict[str, float],
+        stop_reason: str,
+        saturation_shift: Optional[int] = None,
+        placed_by_cancer: Optional[Dict[str, int]] = None,
+        rejected_by_cancer: Optional[Dict[str, int]] = None,
+    ):
+        self.patients_placed = patients_placed
+        self.patients_rejected = patients_rejected
+        self.shifts = shifts
+        self.placement_seconds = placement_seconds
+        self.wall_time_seconds = wall_time_seconds
+        self.utilization = utilization
+        self.stop_reason = stop_reason
+        # furthest shift booked when the first patient was rejected
+        self.saturation_shift = saturation_shift
+        self.placed_by_cancer = placed_by_cancer or {}
+        self.rejected_by_cancer = rejected_by_cancer or {}
+
+    @property
+    def mean_wait_shift(self) -> float:
+        return sum(self.shifts) / len(self.shifts) if self.shifts else 0.0
+
+    @property
+    def max_shift(self) -> int:
+        return max(self.shifts, default=0)
+
+    @property
+    def rejection_rate(self) -> float:
+        seen = self.patients_placed + self.patients_rejected
+        return self.patients_rejected / seen if seen else 0.0
+
+    @property
+    def mean_placement_seconds(self) -> float:
+        if not self.placement_seconds:
+            return 0.0
+        return sum(self.placement_seconds) / len(self.placement_seconds)
+
+    def to_dict(self):
+        return {
+            "patients_placed": self.patients_placed,
+            "patients_rejected": self.patients_rejected,
+            "mean_wait_shift": self.mean_wait_shift,
+            "max_shift": self.max_shift,
+            "saturation_shift": self.saturation_shift,
+            "rejection_rate": self.rejection_rate,
+            "utilization": self.utilization,
+            "mean_placement_seconds": self.mean_placement_seconds,
+            "wall_time_seconds": self.wall_time_seconds,
+            "stop_reason": self.stop_reason,
+            "placed_by_cancer": self.placed_by_cancer,
+            "rejected_by_cancer": self.rejected_by_cancer,
+        }
+
+
+class Simulation:
+    """Headless patient stream.
+
+    Drains the scheduler's patient generator into its calendar until the
+    schedule is full or a budget is reached. Nothing is drawn or printed
+    unless hooks ask for it.
+
+    With ``stop_on_rejection`` off, patients that don't fit are counted as
+    rejected and the run goes on until a budget is reached.
+    """
+
+    def __init__(
+        self,
+        scheduler: Scheduler,
+        max_patients: Optional[int] = None,
+        max_day: Optional[int] = None,
+        hooks: Optional[List[SimulationHook]] = None,
+        stop_on_rejection: bool = True,
+    ):
+        if not stop_on_rejection and max_patients is None:
+            raise ValueError("max_patients is required when rejections don't stop")
+
+        self.scheduler = scheduler
+        self.max_patients = max_patients
+        self.max_day = max_day
+        self.hooks = hooks or []
+        self.stop_on_rejection = stop_on_rejection
+
+    def utilization(self) -> Dict[str, float]:
+        calendar = self.scheduler.calendar
+        return {
+            machine.name(): 1 - calendar[machine].load_level()
+            for machine in sorted(calendar.calendar, key=lambda m: m.name())
+        }
+
+    def run(self) -> SimulationResult:
+        for hook in self.hooks:
+            hook.on_start(self)
+
+        generator = self.scheduler.patient_generator
+        shifts, placement_seconds = [], []
+        rejected = 0
+        placed_by_cancer, rejected_by_cancer = Counter(), Counter()
+        saturation_shift = None
+        stop_reason = STOP_GENERATOR_EXHAUSTED
+
+        started = time.perf_counter()
+        for patient in generator.get_patient():
+            seen = len(shifts) + rejected
+            if self.max_patients is not None and seen >= self.max_patients:
+                stop_reason = STOP_PATIENT_BUDGET
+                break
+
+            if patient.fraction_time_days is None:
+                patient.assign_random_fraction_time(generator.rng)
+
+            placement_started = time.perf_counter()
+            try:
+                machine, shift = self.scheduler.process_patient(patient)
+            except ExtendScheduleError:
+                rejected += 1
+                rejected_by_cancer[patient.cancer.name()] += 1
+                if saturation_shift is None:
+                    saturation_shift = max(shifts, default=0)
+                if self.stop_on_rejection:
+                    stop_reason = STOP_EXTEND_SCHEDULE
+                    break
+                continue
+            placement_seconds.append(time.perf_counter() - placement_started)
+            shifts.append(shift)
+            placed_by_cancer[patient.cancer.name()] += 1
+
+            for hook in self.hooks:
+                hook.on_placement(patient, machine, shift)
+
+            if self.max_day is not None and shift >= self.max_day:
+                stop_reason = STOP_DAY_BUDGET
+                break
+
+        result = SimulationResult(
+            patients_placed=len(shifts),
+            patients_rejected=rejected,
+            shifts=shifts,
+            placement_seconds=placement_seconds,
+            wall_time_seconds=time.perf_counter() - started,
+            utilization=self.utilization(),
+            stop_reason=stop_reason,
+            saturation_shift=saturation_shift,
+            placed_by_cancer=dict(placed_by_cancer),
+            rejected_by_cancer=dict(rejected_by_cancer),
+        )
+        for hook in self.hooks:
+            hook.on_finish(result)
+        return result
@@ -0,0 +1,137 @@
+from bisect import bisect_left
+from typing import Dict, Optional
+
+import numpy as np
+
+
+class SlotError(Exception):
+    def __init__(self, start_minute: int, minutes: int):
+        super().__init__(
+            f"Can't book {minutes} minutes starting at minute {start_minute}."
+        )
+
+
+class DaySlots:
+    """Booked [start, end) minute intervals of one day, sorted by start."""
+
+    __slots__ = ("starts", "ends")
+
+    def __str__(self):
+        return f"{self.__class__.__name__}({list(zip(self.starts, self.ends))})"
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+
+    def __len__(self):
+        return len(self.starts)
+
+    def largest_gap(self, day_length_minutes: int) -> int:
+        """Longest run of free minutes, bookings never overlap."""
+        largest, free_from = 0, 0
+        for start, end in zip(self.starts, self.ends):
+            largest = max(largest, start - free_from)
+            free_from = end
+        return max(largest, day_length_minutes - free_from)
+
+    def book(self, start: int, end: int):
+        position = bisect_left(self.starts, start)
+        self.starts.insert(position, start)
+        self.ends.insert(position, end)
+
+    def free(self, start: int, end: int):
+        position = bisect_left(self.starts, start)
+        while position < len(self.starts) and self.starts[position] == start:
+            if self.ends[position] == end:
+                del self.starts[position]
+                del self.ends[position]
+                return
+            position += 1
+        raise SlotError(start, end - start)
+
+
+class SlotIndex:
+    """Booked intervals of every day of a period.
+
+    Days are keyed by their absolute day number, so advancing or extending
+    the period doesn't move them. Only days with bookings are stored.
+    """
+
+    def __str__(self):
+        return f"{self.__class__.__name__}(booked_days={len(self._days)})"
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __init__(self, day_length_minutes: int):
+        self.day_length_minutes = day_length_minutes
+        self._days: Dict[int, DaySlots] = {}
+
+    def day(self, day: int) -> Optional[DaySlots]:
+        return self._days.get(day)
+
+    def largest_gap(self, day: int) -> int:
+        slots = self._days.get(day)
+        if slots is None:
+            return self.day_length_minutes
+        return slots.largest_gap(self.day_length_minutes)
+
+    def first_free(self, first_day: int, days: int, minutes: int) -> Optional[int]:
+        """Earliest start minute free for ``minutes`` on every day of the window.
+
+        Intervals of all days are merged into one sorted sweep, the first gap
+        long enough wins.
+        """
+        starts, ends = [], []
+        for day in range(first_day, first_day + days):
+            slots = self._days.get(day)
+            if slots:
+                starts.extend(slots.starts)
+                ends.extend(slots.ends)
+
+        if not starts:
+            return 0 if minutes <= self.day_length_minutes else None
+
+        order = np.argsort(starts, kind="stable")
+        starts = np.asarray(starts)[order]
+        busy_until = np.maximum.accumulate(np.asarray(ends)[order])
+
+        gap_starts = np.concatenate(([0], busy_until))
+        gap_ends = np.concatenate((starts, [self.day_length_minutes]))
+        fits = gap_ends - gap_starts >= minutes
+        if not fits.any():
+            return None
+        return int(gap_starts[fits.argmax()])
+
+    def is_free(self, first_day: int, days: int, start: int, minutes: int) -> bool:
+        if start < 0 or start + minutes > self.day_length_minutes:
+            return False
+        for day in range(first_day, first_day + days):
+            slots = self._days.get(day)
+            if not slots:
+                continue
+            position = bisect_left(slots.starts, start + minutes)
+            if position and max(slots.ends[:position]) > start:
+                return False
+        return True
+
+    def book(self, first_day: int, days: int, start: int, minutes: int):
+        for day in range(first_day, first_day + days):
+            self._days.setdefault(day, DaySlots()).book(start, start + minutes)
+
+    def free(self, first_day: int, days: int, start: int, minutes: int):
+        for day in range(first_day, first_day + days):
+            slots = self._days.get(day)
+            if slots is None:
+                raise SlotError(start, minutes)
+            slots.free(start, start + minutes)
+            if not slots:
+                del self._days[day]
+
+    def retire(self, first_day: int, days: int):
+        """Forget days [first_day, first_day + days)."""
+        for day in range(first_day, first_day + days):
+            self._days.pop(day, None)
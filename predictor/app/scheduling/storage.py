@@ -0,0 +1,229 @@
+import os
+import threading
+from typing import BinaryIO, List, Optional, TYPE_CHECKING
+
+import numpy as np
+
+from scheduling.calendar import MachineCalendar
+from scheduling.machines import BaseMachine
+
+if TYPE_CHECKING:
+    from scheduling.machine_pool import MachinePool
+
+MAGIC = b"RTCALNDR"
+FORMAT_VERSION = 2
+HEADER_BYTES = 4096
+HEADER_DTYPE = np.dtype(
+    [
+        ("magic", "S8"),
+        ("format", "<u4"),
+        ("day_length_minutes", "<i4"),
+        ("period_length_days", "<i8"),
+        ("machines", "<i8"),
+        ("version", "<i8"),
+        ("current_day", "<i8"),
+    ]
+)
+# one entry per machine after the header fields, in machine name order
+MACHINE_DTYPE = np.dtype(
+    [
+        ("name", "S24"),
+        ("origin", "<i8"),
+        ("day_offset", "<i8"),
+        ("free_minutes_total", "<i8"),
+        ("busy_days", "<i8"),
+        ("version", "<i8"),
+    ]
+)
+MAX_MACHINES = (HEADER_BYTES - HEADER_DTYPE.itemsize) // MACHINE_DTYPE.itemsize
+
+
+class CalendarFileError(Exception):
+    def __init__(self, path: str, reason: str):
+        super().__init__(f"Calendar file {path}: {reason}")
+
+
+class CalendarFile:
+    """Free minutes of every machine in a memory-mapped file.
+
+    A 4 KiB header holds the day length, the horizon, the calendar version
+    and the current day, and per machine its name, ring-buffer origin and
+    running totals. An int32 (machines x days) matrix follows, its rows are
+    the periods' storage, so bookings write straight into the mapped pages
+    and opening a file reads no minutes at all.
+
+    The ring state is written on ``advance``, ``grow`` and ``replace``, the
+    version also on every booking, cancellation and move. Pages written by
+    a crashed process still reach the file, ``flush`` makes them durable
+    against losing the machine. Appointments and the slots of slotted
+    calendars are not stored.
+    """
+
+    def __str__(self):
+        return f"{self.__class__.__name__}(path={self.path})"
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file: Optional[BinaryIO] = None
+        self.header: Optional[np.ndarray] = None
+        # MACHINE_DTYPE records
+        self.machines: Optional[np.ndarray] = None
+        self.matrix: Optional[np.ndarray] = None
+        self._map: Optional[np.memmap] = None
+        self._version_lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path: str) -> "CalendarFile":
+        """Map an existing file, ``matrix`` holds the free minutes."""
+        calendar_file = cls(path)
+        calendar_file.file = open(path, "r+b")
+        calendar_file._map_file(
+            np.memmap(calendar_file.file, dtype=np.uint8, mode="r+")
+        )
+        return calendar_file
+
+    def machine_names(self) -> List[str]:
+        return [name.decode() for name in self.machines["name"]]
+
+    @classmethod
+    def create(cls, path: str, machine_calendar: MachineCalendar) -> "CalendarFile":
+        """Store ``machine_calendar`` at ``path``, it keeps writing to the file."""
+        calendar_file = cls(path)
+        calendar_file.write(machine_calendar)
+        return calendar_file
+
+    @classmethod
+    def load(
+        cls,
+        path: str,
+        machine_pool: "MachinePool",
+        max_calendar_length_days: Optional[int] = None,
+        indexed: bool = False,
+    ) -> MachineCalendar:
+        """Open the calendar stored at ``path``, its periods use the mapped rows."""
+        calendar_file = cls.open(path)
+        header = calendar_file.header
+
+        machine_calendar = MachineCalendar(
+            machine_pool,
+            int(header["period_length_days"][0]),
+            indexed=indexed,
+            max_calendar_length_days=max_calendar_length_days,
+        )
+        machines = calendar_file.check_machines(machine_calendar)
+        for row, machine in enumerate(machines):
+            machine_calendar[machine].load(
+                calendar_file.matrix[row],
+                int(calendar_file.machines["origin"][row]),
+                int(calendar_file.machines["day_offset"][row]),
+            )
+        machine_calendar.current_day = int(header["current_day"][0])
+        # past every version served before, even one from a booking that
+        # reached the pages just before a crash
+        machine_calendar.version = int(header["version"][0]) + 1
+        machine_calendar.storage = calendar_file
+        return machine_calendar
+
+    def check_machines(self, machine_calendar: MachineCalendar) -> List[BaseMachine]:
+        """Machines of the calendar in row order, raises unless the file has them."""
+        machines = machine_calendar.sorted_machines()
+        names = self.machine_names()
+        if names != [machine.name() for machine in machines]:
+            raise CalendarFileError(self.path, f"stores machines {names}")
+        day_length_minutes = int(self.header["day_length_minutes"][0])
+        for machine in machines:
+            if machine_calendar[machine].day_length_minutes != day_length_minutes:
+                raise CalendarFileError(
+                    self.path, f"stores {day_length_minutes} minute days"
+                )
+        return machines
+
+    def _map_file(self, file_map: np.memmap):
+        header = file_map[: HEADER_DTYPE.itemsize].view(HEADER_DTYPE)
+        if header["magic"][0] != MAGIC:
+            raise CalendarFileError(self.path, "is not a calendar file")
+        if header["format"][0] != FORMAT_VERSION:
+            raise CalendarFileError(
+                self.path, f"has unsupported format {header['format'][0]}"
+            )
+        machines = int(header["machines"][0])
+        days = int(header["period_length_days"][0])
+        if len(file_map) != HEADER_BYTES + machines * days * 4:
+            raise CalendarFileError(self.path, "is truncated")
+
+        self._map = file_map
+        self.header = header
+        self.machines = file_map[
+            HEADER_DTYPE.itemsize : HEADER_DTYPE.itemsize
+            + machines * MACHINE_DTYPE.itemsize
+        ].view(MACHINE_DTYPE)
+        self.matrix = file_map[HEADER_BYTES:].view(np.int32).reshape(machines, days)
+
+    def write(self, machine_calendar: MachineCalendar):
+        """Store the whole calendar in a new file and move its periods onto it.
+
+        The file is built next to ``path`` and renamed over it, a crash
+        leaves the previous file intact.
+        """
+        if machine_calendar.slotted:
+            raise CalendarFileError(self.path, "can't store slotted calendars")
+        machines = machine_calendar.sorted_machines()
+        if len(machines) > MAX_MACHINES:
+            raise CalendarFileError(self.path, f"holds at most {MAX_MACHINES} machines")
+        days = machine_calendar.calendar_length_days
+
+        temporary_path = f"{self.path}.tmp"
+        file_map = np.memmap(
+            temporary_path,
+            dtype=np.uint8,
+            mode="w+",
+            shape=(HEADER_BYTES + len(machines) * days * 4,),
+        )
+        header = file_map[: HEADER_DTYPE.itemsize].view(HEADER_DTYPE)
+        header["magic"] = MAGIC
+        header["format"] = FORMAT_VERSION
+        header["day_length_minutes"] = machine_calendar[machines[0]].day_length_minutes
+        header["period_length_days"] = days
+        header["machines"] = len(machines)
+        self._map_file(file_map)
+        self.machines["name"] = [machine.name().encode() for machine in machines]
+
+        # moving the periods onto the file changes no minutes, nor the version
+        version = machine_calendar.version
+        for row, machine in enumerate(machines):
+            period = machine_calendar[machine]
+            self.matrix[row] = period.free_minutes()
+            period.load(self.matrix[row], 0, period.day_offset)
+        machine_calendar.version = version
+        self.write_header(machine_calendar)
+        file_map.flush()
+        os.replace(temporary_path, self.path)
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        machine_calendar.storage = self
+
+    def write_header(self, machine_calendar: MachineCalendar):
+        """Record the version, the current day and the ring state of every period."""
+        self.header["version"] = machine_calendar.version
+        self.header["current_day"] = machine_calendar.current_day
+        for row, machine in enumerate(machine_calendar.sorted_machines()):
+            period = machine_calendar[machine]
+            self.machines["origin"][row] = period.origin
+            self.machines["day_offset"][row] = period.day_offset
+            self.machines["free_minutes_total"][row] = period.free_minutes_total
+            self.machines["busy_days"][row] = period.busy_days
+            self.machines["version"][row] = period.version
+
+    def record_version(self, version: int):
+        """Keep the highest version in the header, bookings may report out of order."""
+        with self._version_lock:
+            if version > self.header["version"][0]:
+                self.header["version"] = version
+
+    def flush(self, machine_calendar: MachineCalendar):
+        self.write_header(machine_calendar)
+        self._map.flush()
@@ -0,0 +1,190 @@
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from scheduling.appointments import AppointmentNotFound
+from scheduling.calendar import MachineCalendar
+from scheduling.metrics import COMMIT_CONFLICTS
+from scheduling.patients import PatientGen
+from scheduling.scheduler import ExtendScheduleError, Scheduler
+from scheduling.utils import build_machine_pool
+
+
+class OverbookedError(Exception):
+    def __init__(self, machine_name: str, shift: int, detail: str):
+        super().__init__(
+            f"Machine {machine_name} is overbooked on shift {shift}: {detail}"
+        )
+
+
+def check_consistency(machine_calendar: MachineCalendar):
+    """Raise ``OverbookedError`` unless the periods match the ledger.
+
+    Every machine's free minutes must equal the day length minus the
+    minutes of its appointments, and never drop below zero. Start minutes
+    of slotted appointments must not overlap.
+    """
+    length = machine_calendar.calendar_length_days
+    used = {
+        machine: np.zeros(length, dtype=np.int64)
+        for machine in machine_calendar.calendar
+    }
+    intervals = defaultdict(list)
+    for appointment in machine_calendar.ledger:
+        shift = machine_calendar.shift_of(appointment)
+        first, stop = max(shift, 0), max(shift + appointment.days, 0)
+        used[appointment.machine][first:stop] += appointment.allocated_time_minutes
+        if appointment.start_minute is not None:
+            for day in range(first, stop):
+                intervals[appointment.machine, day].append(
+                    (
+                        appointment.start_minute,
+                        appointment.start_minute + appointment.allocated_time_minutes,
+                    )
+                )
+
+    for machine, period in machine_calendar.calendar.items():
+        free = period.free_minutes()
+        negative = np.flatnonzero(free < 0)
+        if len(negative):
+            shift = int(negative[0])
+            raise OverbookedError(machine.name(), shift, f"{free[shift]} minutes left")
+        mismatch = np.flatnonzero(free != period.day_length_minutes - used[machine])
+        if len(mismatch):
+            shift = int(mismatch[0])
+            raise OverbookedError(
+                machine.name(),
+                shift,
+                f"{free[shift]} minutes left, the ledger leaves "
+                f"{period.day_length_minutes - used[machine][shift]}",
+            )
+
+    for (machine, shift), booked in intervals.items():
+        booked.sort()
+        for (_, end), (start, _) in zip(booked, booked[1:]):
+            if start < end:
+                raise OverbookedError(
+                    machine.name(), shift, f"courses overlap at minute {start}"
+                )
+
+
+def stress(
+    threads: int = 16,
+    patients_per_thread: int = 200,
+    cancel_share: float = 0.2,
+    period_length_days: int = 60,
+    max_period_length_days: Optional[int] = 240,
+    advance_days: int = 5,
+    slotted: bool = False,
+    seed: int = 0,
+) -> Dict:
+    """Book and cancel from ``threads`` threads on one calendar, then check it.
+
+    Every thread places its patients through its own ``Scheduler``, like
+    concurrent ``/schedule`` requests, and cancels ``cancel_share`` of its
+    bookings. Meanwhile the calendar advances ``advance_days`` times and
+    grows when full.
+    """
+    machine_pool = build_machine_pool()
+    machine_calendar = MachineCalendar(
+        machine_pool,
+        period_length_days,
+        max_calendar_length_days=max_period_length_days,
+        slotted=slotted,
+    )
+    counts = defaultdict(int)
+    counts_lock = threading.Lock()
+    errors: List[BaseException] = []
+    conflicts_before = COMMIT_CONFLICTS.value()
+    start = threading.Barrier(threads + 1)
+
+    def book(worker: int):
+        rng = random.Random(seed * 1000 + worker)
+        patients = PatientGen(rng).get_patient()
+        scheduler = Scheduler(
+            machine_calendar.calendar_length_days, machine_pool, None, machine_calendar
+        )
+        booked, cancelled, rejected = [], 0, 0
+        start.wait()
+        try:
+            for _ in range(patients_per_thread):
+                patient = next(patients)
+                patient.assign_random_fraction_time(rng)
+                try:
+                    booked.append(scheduler.book_patient(patient))
+                except ExtendScheduleError:
+                    rejected += 1
+                if booked and rng.random() < cancel_share:
+                    appointment = booked.pop(rng.randrange(len(booked)))
+                    try:
+                        machine_calendar.cancel(appointment.appointment_id)
+                        cancelled += 1
+                    except AppointmentNotFound:
+                        pass
+        except BaseException as e:
+            errors.append(e)
+        with counts_lock:
+            counts["booked"] += len(booked) + cancelled
+            counts["cancelled"] += cancelled
+            counts["rejected"] += rejected
+
+    def advance():
+        start.wait()
+        for _ in range(advance_days):
+            time.sleep(0.01)
+            machine_calendar.advance(1)
+
+    workers = [threading.Thread(target=book, args=(n,)) for n in range(threads)]
+    workers.append(threading.Thread(target=advance))
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    seconds = time.perf_counter() - started
+
+    if errors:
+        raise errors[0]
+    check_consistency(machine_calendar)
+    return {
+        **counts,
+        "commit_conflicts": int(COMMIT_CONFLICTS.value() - conflicts_before),
+        "appointments": len(machine_calendar.ledger),
+        "calendar_length_days": machine_calendar.calendar_length_days,
+        "current_day": machine_calendar.current_day,
+        "seconds": round(seconds, 3),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(
+        description="Concurrent bookings on one calendar, fails on overbooking"
+    )
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--patients", type=int, default=200)
+    parser.add_argument("--cancel-share", type=float, default=0.2)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--max-days", type=int, default=240)
+    parser.add_argument("--advance", type=int, default=5)
+    parser.add_argument("--slotted", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    summary = stress(
+        args.threads,
+        args.patients,
+        args.cancel_share,
+        args.days,
+        args.max_days,
+        args.advance,
+        args.slotted,
+        args.seed,
+    )
+    print(json.dumps(summary, indent=2))
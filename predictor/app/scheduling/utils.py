@@ -1,27 +1,73 @@
+import os
+from typing import Optional
+
 from scheduling.calendar import MachineCalendar
 from scheduling.machine_pool import MachinePool
 from scheduling.machines import TB2Machine, VB2Machine, VB1Machine, TB1Machine, UMachine
 from scheduling.patients import PatientGen
+from scheduling.shared import open_shared_calendar
+from scheduling.storage import CalendarFile
+from scheduling.wal import AllocationLog
 
 _CACHE = {}
 
 
+def build_machine_pool() -> MachinePool:
+    return MachinePool(
+        "MachinePool",
+        [
+            MachinePool("TBPool", [TB1Machine(), TB2Machine()]),
+            MachinePool("VBPool", [VB1Machine(), VB2Machine()]),
+            MachinePool("UPool", [UMachine()]),
+        ],
+    )
+
+
 def get_machine_pool():
     if not _CACHE.get("pool"):
-        _CACHE["pool"] = MachinePool(
-            "MachinePool",
-            [
-                MachinePool("TBPool", [TB1Machine(), TB2Machine()]),
-                MachinePool("VBPool", [VB1Machine(), VB2Machine()]),
-                MachinePool("UPool", [UMachine()]),
-            ],
-        )
+        _CACHE["pool"] = build_machine_pool()
     return _CACHE["pool"]
 
 
-def get_machine_calendar(machine_pool, period_length_days) -> MachineCalendar:
+def get_machine_calendar(
+    machine_pool,
+    period_length_days,
+    max_period_length_days=None,
+    slotted=False,
+    path: Optional[str] = None,
+    shared: bool = False,
+    log_directory: Optional[str] = None,
+) -> MachineCalendar:
+    """Shared calendar, kept in the file at ``path`` if one is given.
+
+    An existing file is opened as it is, ``period_length_days`` only sizes
+    a new one. A ``shared`` file is one calendar for every process opening
+    it, its horizon is fixed to the longest one. With a ``log_directory``
+    the calendar is recovered from its allocation log and keeps logging.
+    """
     if not _CACHE.get("machine_calendar"):
-        _CACHE["machine_calendar"] = MachineCalendar(machine_pool, period_length_days)
+        if shared:
+            machine_calendar = open_shared_calendar(
+                path, machine_pool, max_period_length_days or period_length_days
+            )
+        elif log_directory is not None:
+            machine_calendar = AllocationLog.recover(
+                log_directory, machine_pool, period_length_days, max_period_length_days
+            )
+        elif path is not None and os.path.exists(path):
+            machine_calendar = CalendarFile.load(
+                path, machine_pool, max_period_length_days
+            )
+        else:
+            machine_calendar = MachineCalendar(
+                machine_pool,
+                period_length_days,
+                max_calendar_length_days=max_period_length_days,
+                slotted=slotted,
+            )
+            if path is not None:
+                CalendarFile.create(path, machine_calendar)
+        _CACHE["machine_calendar"] = machine_calendar
     return _CACHE["machine_calendar"]
 
 
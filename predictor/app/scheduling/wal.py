@@ -0,0 +1,375 @@
+import os
+import re
+import struct
+import threading
+from typing import List, Optional, TYPE_CHECKING
+
+import numpy as np
+
+from scheduling.calendar import MachineCalendar
+from scheduling.storage import CalendarFile
+
+if TYPE_CHECKING:
+    from scheduling.machine_pool import MachinePool
+
+ALLOCATED = 1
+RELEASED = 2
+ADVANCED = 3
+
+# kind, machine row, first calendar day, days, minutes, appointment id, version
+RECORD = struct.Struct("<BxHiiiqq")
+RECORD_DTYPE = np.dtype(
+    [
+        ("kind", "u1"),
+        ("reserved", "u1"),
+        ("machine", "<u2"),
+        # the new current day of ADVANCED records
+        ("start_day", "<i4"),
+        ("days", "<i4"),
+        ("minutes", "<i4"),
+        ("appointment_id", "<i8"),
+        ("version", "<i8"),
+        ("checksum", "<u4"),
+    ]
+)
+CHECKSUM_SEED = 0x9E3779B9
+CHECKSUM_WEIGHTS = np.array(
+    [
+        0x01000193,
+        0x2545F491,
+        0x27D4EB2F,
+        0x165667B1,
+        0x61C88647,
+        0x7FEB352D,
+        0x3C6EF372,
+        0x5BD1E995,
+    ],
+    dtype=np.uint32,
+)
+WORDS = struct.Struct(f"<{len(CHECKSUM_WEIGHTS)}I")
+assert RECORD_DTYPE.itemsize == RECORD.size + 4 == WORDS.size + 4
+
+# records per segment before ``MachineCalendar.sync`` checkpoints
+CHECKPOINT_RECORDS = 100_000
+
+SEGMENT_NAME = re.compile(r"^segment-(\d+)\.log$")
+CHECKPOINT_NAME = re.compile(r"^checkpoint-(\d+)\.bin$")
+
+
+class ReplayError(Exception):
+    def __init__(self, reason: str):
+        super().__init__(f"Can't replay the allocation log: {reason}")
+
+
+def _segment_path(directory: str, segment: int) -> str:
+    return os.path.join(directory, f"segment-{segment:08d}.log")
+
+
+def _checkpoint_path(directory: str, segment: int) -> str:
+    return os.path.join(directory, f"checkpoint-{segment:08d}.bin")
+
+
+def _numbered(directory: str, pattern: re.Pattern) -> List[int]:
+    matches = map(pattern.match, os.listdir(directory))
+    return sorted(int(match.group(1)) for match in matches if match)
+
+
+def _checksum(body: bytes) -> int:
+    words = WORDS.unpack(body)
+    total = CHECKSUM_SEED
+    for word, weight in zip(words, CHECKSUM_WEIGHTS.tolist()):
+        total += word * weight
+    return total & 0xFFFFFFFF
+
+
+def _checksums(records: np.ndarray) -> np.ndarray:
+    body = np.ascontiguousarray(
+        records.view(np.uint8).reshape(len(records), RECORD_DTYPE.itemsize)[
+            :, : WORDS.size
+        ]
+    )
+    # uint32 arithmetic wraps modulo 2**32 like the masked sum of ``_checksum``
+    weighted = body.view("<u4") * CHECKSUM_WEIGHTS
+    return weighted.sum(axis=1, dtype=np.uint32) + np.uint32(CHECKSUM_SEED)
+
+
+def read_segment(path: str) -> np.ndarray:
+    """Records of a segment up to the first torn or corrupt one.
+
+    A crash can cut the last write short, nothing after it was acknowledged.
+    """
+    data = np.fromfile(path, dtype=np.uint8)
+    count = len(data) // RECORD_DTYPE.itemsize
+    records = data[: count * RECORD_DTYPE.itemsize].view(RECORD_DTYPE)
+    broken = np.flatnonzero(_checksums(records) != records["checksum"])
+    if len(broken):
+        records = records[: broken[0]]
+    return records
+
+
+def replay(machine_calendar: MachineCalendar, records: np.ndarray):
+    """Apply logged changes in one vectorized pass.
+
+    The calendar advances to the last logged day. Every change becomes a
+    +minutes/-minutes step at its first and past its last day, a cumulative
+    sum turns the steps of each machine into its minutes per day. Changes
+    commute, so the order of records within the log doesn't matter. The
+    version continues past the highest logged one.
+    """
+    if not len(records):
+        return
+    # replayed changes keep their logged versions, ``take`` mustn't count them
+    version = machine_calendar.version
+    kinds = records["kind"]
+    advances = records["start_day"][kinds == ADVANCED]
+    if len(advances) and int(advances.max()) > machine_calendar.current_day:
+        machine_calendar.advance_to(int(advances.max()))
+
+    # fields are copied out once, masking whole records is much slower
+    shift = records["start_day"].astype(np.int64) - machine_calendar.current_day
+    start, stop = np.maximum(shift, 0), shift + records["days"]
+    live = (stop > 0) & ((kinds == ALLOCATED) | (kinds == RELEASED))
+    start, stop = start[live], stop[live]
+    minutes = records["minutes"].astype(np.int64)
+    minutes[kinds == RELEASED] *= -1
+    minutes = minutes[live]
+    rows = records["machine"][live].astype(np.int64)
+
+    machines = machine_calendar.sorted_machines()
+    if len(rows) and int(rows.max()) >= len(machines):
+        raise ReplayError(f"machine row {rows.max()} of {len(machines)} machines")
+    if len(stop):
+        length = int(stop.max())
+        if length > machine_calendar.calendar_length_days:
+            machine_calendar.grow(length)
+        if length > machine_calendar.calendar_length_days:
+            raise ReplayError(f"the calendar can't grow to {length} days")
+
+        width = length + 1
+        steps = np.bincount(
+            np.concatenate([rows * width + start, rows * width + stop]),
+            np.concatenate([minutes, -minutes]).astype(np.float64),
+            minlength=len(machines) * width,
+        )
+        usage = steps.reshape(len(machines), width)[:, :length].cumsum(axis=1)
+        usage = usage.round().astype(np.int64)
+        for row, machine in enumerate(machines):
+            if usage[row].any():
+                machine_calendar[machine].take(usage[row])
+
+    # a change applied but lost before its fsync may have been served, the
+    # next change mustn't reuse its version
+    machine_calendar.version = max(version, int(records["version"].max())) + 1
+
+
+class AllocationLog:
+    """Write-ahead log of a calendar's bookings, cancellations and advances.
+
+    Every change is a fixed 36 byte record in the current segment file.
+    Appends only buffer the record; ``sync`` writes the buffer and fsyncs,
+    and callers arriving during an fsync are covered by the next one, so a
+    burst of bookings shares a handful of fsyncs (group commit).
+
+    A checkpoint is a ``CalendarFile`` of the whole calendar taken when a
+    new segment starts, older segments and checkpoints are then deleted.
+    ``recover`` loads the newest checkpoint and replays the segments after
+    it. Slots and the appointments themselves are not restored.
+    """
+
+    def __str__(self):
+        return (
+            f"{self.__class__.__name__}(directory={self.directory}, "
+            f"segment={self.segment})"
+        )
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __init__(
+        self, directory: str, segment: int, checkpoint_records: int = CHECKPOINT_RECORDS
+    ):
+        self.directory = directory
+        self.segment = segment
+        self.checkpoint_records = checkpoint_records
+        self._file = open(_segment_path(directory, segment), "ab")
+        self._condition = threading.Condition(threading.Lock())
+        self._pending = bytearray()
+        # records appended and made durable so far, ``sync`` compares them
+        self._appended = 0
+        self._durable = 0
+        self._syncing = False
+        self._segment_records = 0
+        self._checkpoint_due = False
+        self._checkpoint_lock = threading.Lock()
+
+    @classmethod
+    def recover(
+        cls,
+        directory: str,
+        machine_pool: "MachinePool",
+        calendar_length_days: int,
+        max_calendar_length_days: Optional[int] = None,
+        indexed: bool = False,
+        checkpoint_records: int = CHECKPOINT_RECORDS,
+    ) -> MachineCalendar:
+        """Rebuild the calendar logged in ``directory`` and keep logging to it.
+
+        Without a checkpoint a new calendar of ``calendar_length_days`` is
+        started. The rebuilt calendar is checkpointed right away, the next
+        recovery doesn't replay the same segments again.
+        """
+        os.makedirs(directory, exist_ok=True)
+        checkpoints = _numbered(directory, CHECKPOINT_NAME)
+        segments = _numbered(directory, SEGMENT_NAME)
+        if checkpoints:
+            first = checkpoints[-1]
+            # loading continues one past the checkpoint's version
+            machine_calendar = CalendarFile.load(
+                _checkpoint_path(directory, first),
+                machine_pool,
+                max_calendar_length_days,
+                indexed,
+            ).copy()
+            records = [
+                read_segment(_segment_path(directory, segment))
+                for segment in segments
+                if segment >= first
+            ]
+            if records:
+                replay(machine_calendar, np.concatenate(records))
+        else:
+            machine_calendar = MachineCalendar(
+                machine_pool,
+                calendar_length_days,
+                indexed=indexed,
+                max_calendar_length_days=max_calendar_length_days,
+            )
+
+        segment = max(checkpoints + segments, default=-1) + 1
+        log = cls(directory, segment, checkpoint_records)
+        log.write_checkpoint(machine_calendar.copy(), segment)
+        machine_calendar.log = log
+        return machine_calendar
+
+    def allocated(
+        self,
+        machine: int,
+        start_day: int,
+        days: int,
+        minutes: int,
+        appointment_id: int,
+        version: int,
+    ) -> int:
+        return self._append(
+            ALLOCATED, machine, start_day, days, minutes, appointment_id, version
+        )
+
+    def released(
+        self,
+        machine: int,
+        start_day: int,
+        days: int,
+        minutes: int,
+        appointment_id: int,
+        version: int,
+    ) -> int:
+        return self._append(
+            RELEASED, machine, start_day, days, minutes, appointment_id, version
+        )
+
+    def advanced(self, current_day: int, version: int) -> int:
+        return self._append(ADVANCED, 0, current_day, 0, 0, 0, version)
+
+    def _append(self, kind: int, *fields) -> int:
+        """Buffer a record, returns its sequence number for ``sync``."""
+        body = RECORD.pack(kind, *fields)
+        record = body + struct.pack("<I", _checksum(body))
+        with self._condition:
+            self._pending += record
+            self._appended += 1
+            self._segment_records += 1
+            if self._segment_records >= self.checkpoint_records:
+                self._checkpoint_due = True
+            return self._appended
+
+    def sync(self, sequence: Optional[int] = None):
+        """Wait until record ``sequence``, by default every record, is on disk.
+
+        The first waiter writes everything buffered and fsyncs, the others
+        wait for it and then find their records durable or start the next.
+        """
+        with self._condition:
+            if sequence is None:
+                sequence = self._appended
+            while self._durable < sequence:
+                if self._syncing:
+                    self._condition.wait()
+                    continue
+
+                pending, self._pending = self._pending, bytearray()
+                appended = self._appended
+                self._syncing = True
+                self._condition.release()
+                written = False
+                try:
+                    self._file.write(pending)
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                    written = True
+                finally:
+                    self._condition.acquire()
+                    self._syncing = False
+                    if written:
+                        self._durable = appended
+                    else:  # the next waiter tries again
+                        self._pending[:0] = pending
+                    self._condition.notify_all()
+
+    def checkpoint_due(self) -> bool:
+        """True once per segment that reached ``checkpoint_records``."""
+        with self._condition:
+            due, self._checkpoint_due = self._checkpoint_due, False
+            return due
+
+    def rotate(self) -> int:
+        """Continue in a new segment, returns its number.
+
+        Call with no changes running, the checkpoint for the new segment
+        must hold exactly the changes logged before it.
+        """
+        self.sync()
+        with self._condition:
+            self._file.close()
+            self.segment += 1
+            self._file = open(_segment_path(self.directory, self.segment), "ab")
+            self._segment_records = 0
+            self._checkpoint_due = False
+            return self.segment
+
+    def write_checkpoint(self, snapshot: MachineCalendar, segment: int):
+        """Store ``snapshot`` as the state before ``segment``, drop older files.
+
+        ``snapshot`` moves onto the checkpoint file, pass a copy.
+        """
+        with self._checkpoint_lock:
+            CalendarFile.create(_checkpoint_path(self.directory, segment), snapshot)
+            self._sync_directory()
+            for older in _numbered(self.directory, CHECKPOINT_NAME):
+                if older < segment:
+                    os.remove(_checkpoint_path(self.directory, older))
+            for older in _numbered(self.directory, SEGMENT_NAME):
+                if older < segment:
+                    os.remove(_segment_path(self.directory, older))
+
+    def _sync_directory(self):
+        # makes the renamed checkpoint and new segments survive a crash
+        descriptor = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+    def close(self):
+        self.sync()
+        with self._condition:
+            self._file.close()
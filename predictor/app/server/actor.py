@@ -0,0 +1,185 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Any, Callable, List, Optional, Tuple
+
+from scheduling.appointments import Appointment
+from scheduling.calendar import MachineCalendar
+from scheduling.machine_pool import MachinePool
+from scheduling.patients import Patient
+from scheduling.scheduler import Scheduler
+
+# bookings arriving this close to each other are placed in one pass
+COALESCE_SECONDS = 0.002
+MAX_BATCH = 64
+
+
+class ActorStoppedError(Exception):
+    def __init__(self):
+        super().__init__("Scheduling actor is not running")
+
+
+class _Change:
+    """A queued booking of ``patient`` or a call of ``function``."""
+
+    __slots__ = ("patient", "function", "args", "future")
+
+    def __init__(
+        self,
+        future: asyncio.Future,
+        patient: Optional[Patient] = None,
+        function: Optional[Callable] = None,
+        args: Tuple = (),
+    ):
+        self.future = future
+        self.patient = patient
+        self.function = function
+        self.args = args
+
+
+class SchedulingActor:
+    """Single writer of the shared calendar.
+
+    Changes are queued and run in arrival order on one thread, so they
+    never wait for each other's locks and the event loop keeps serving
+    reads. Bookings arriving within ``coalesce_seconds`` of the first one
+    are placed in one pass in arrival order, a burst costs one hop to the
+    writer thread instead of one per request.
+
+    A pass holds the calendar lock exclusive once, the lock calls of each
+    change within it pass straight through; snapshots, swaps and
+    checkpoints on other threads run between passes. The per-machine
+    period locks are still taken, the same methods serve concurrent
+    writers without an actor, but nothing else contends for them.
+    """
+
+    def __str__(self):
+        return f"{self.__class__.__name__}(running={self.running})"
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __init__(
+        self,
+        machine_calendar: MachineCalendar,
+        machine_pool: MachinePool,
+        coalesce_seconds: float = COALESCE_SECONDS,
+        max_batch: int = MAX_BATCH,
+    ):
+        self.calendar = machine_calendar
+        self.coalesce_seconds = coalesce_seconds
+        self.max_batch = max_batch
+        self.scheduler = Scheduler(
+            machine_calendar.calendar_length_days, machine_pool, None, machine_calendar
+        )
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        """Start draining the queue on the running event loop."""
+        if self.running:
+            return self
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="scheduling-actor")
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    async def stop(self):
+        """Finish the queued changes, then stop."""
+        if not self.running:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._executor.shutdown()
+        self._task = None
+
+    async def book(self, patient: Patient) -> Appointment:
+        """Place a patient, raises ``ExtendScheduleError`` if it doesn't fit."""
+        return await self._submit(patient=patient)
+
+    async def call(self, function: Callable, *args) -> Any:
+        """Run any other change of the calendar on the writer thread."""
+        return await self._submit(function=function, args=args)
+
+    async def _submit(self, **change) -> Any:
+        if not self.running:
+            raise ActorStoppedError
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_Change(future, **change))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            changes = await self._collect()
+            try:
+                outcomes = await loop.run_in_executor(
+                    self._executor, self._apply, changes
+                )
+            except Exception as e:
+                outcomes = [(None, e)] * len(changes)
+
+            for change, (result, error) in zip(changes, outcomes):
+                if change.future.done():  # the request went away
+                    continue
+                if error is not None:
+                    change.future.set_exception(error)
+                else:
+                    change.future.set_result(result)
+            for _ in changes:
+                self._queue.task_done()
+
+    async def _collect(self) -> List[_Change]:
+        changes = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.coalesce_seconds
+        while len(changes) < self.max_batch:
+            if not self._queue.empty():
+                changes.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                changes.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return changes
+
+    def _apply(self, changes: List[_Change]) -> List[Tuple[Any, Optional[Exception]]]:
+        """Run on the writer thread, every change gets its own outcome.
+
+        A failing booking doesn't fail the others of the pass, they are
+        already in the calendar and their requests must hear about it.
+        """
+        outcomes = []
+        locked = (
+            self.calendar.lock.exclusive()
+            if self.calendar.batch_locking
+            else nullcontext()
+        )
+        with locked:
+            for change in changes:
+                try:
+                    if change.patient is None:
+                        outcomes.append((change.function(*change.args), None))
+                        continue
+                    # the calendar may have grown since the last booking
+                    self.scheduler.period_length_days = (
+                        self.calendar.calendar_length_days
+                    )
+                    outcomes.append(
+                        (self.scheduler.book_patient(change.patient), None)
+                    )
+                except Exception as e:
+                    outcomes.append((None, e))
+        return outcomes
@@ -0,0 +1,90 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Hashable, Iterable, Iterator, Optional, Tuple
+
+
+class ResponseCache:
+    """LRU cache of rendered response bodies.
+
+    Keys carry the calendar version, so entries of an older calendar are
+    never served and simply age out.
+    """
+
+    def __str__(self):
+        return f"{self.__class__.__name__}(entries={len(self._entries)})"
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(endpoint: str, params: Tuple, version: int) -> Tuple:
+        return endpoint, params, version
+
+    @staticmethod
+    def etag(key: Tuple) -> str:
+        endpoint, params, version = key
+        digest = hashlib.blake2b(
+            repr((endpoint, params)).encode(), digest_size=8
+        ).hexdigest()
+        return f'"{version}-{digest}"'
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key: Hashable, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key))
+            self._entries[key] = body
+            self._size += len(body)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def tee(self, key: Hashable, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Pass ``chunks`` on and cache the whole body once it is complete.
+
+        Bodies larger than the cache are dropped as soon as they outgrow it,
+        a streamed report is never held in memory in full.
+        """
+        parts: Optional[list] = []
+        size = 0
+        for chunk in chunks:
+            if parts is not None:
+                size += len(chunk)
+                if size <= self.max_bytes:
+                    parts.append(chunk)
+                else:
+                    parts = None
+            yield chunk
+        if parts is not None:
+            self.put(key, b"".join(parts))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
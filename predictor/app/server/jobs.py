@@ -0,0 +1,141 @@
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from scheduling.calendar import MachineCalendar
+from scheduling.constants import (
+    JOB_DISCARDED,
+    JOB_FAILED,
+    JOB_RUNNING,
+    JOB_STALE,
+    JOB_SWAPPED,
+    OPTIMIZER_DELAY_WEIGHT,
+    OPTIMIZER_MAX_DELAY_DAYS,
+)
+from scheduling.machine_pool import MachinePool
+from scheduling.optimizer import OptimizationResult, Optimizer
+
+
+class JobNotFound(Exception):
+    def __init__(self, job_id: int):
+        super().__init__(f"Job {job_id} not found")
+
+
+class OptimizationJob:
+    """Optimizes a snapshot of the shared calendar in a background thread.
+
+    The snapshot is swapped in only if the shared calendar hasn't changed
+    since it was taken, otherwise bookings made meanwhile would be lost.
+    """
+
+    def __str__(self):
+        return f"{self.__class__.__name__}(job_id={self.job_id}, status={self.status})"
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __init__(
+        self,
+        job_id: int,
+        machine_calendar: MachineCalendar,
+        machine_pool: MachinePool,
+        time_budget_seconds: float,
+        seed: Optional[int] = None,
+        max_delay_days: int = OPTIMIZER_MAX_DELAY_DAYS,
+        delay_weight: float = OPTIMIZER_DELAY_WEIGHT,
+    ):
+        self.job_id = job_id
+        self.status = JOB_RUNNING
+        self.result: Optional[OptimizationResult] = None
+        self.error: Optional[str] = None
+
+        self._machine_calendar = machine_calendar
+        self._machine_pool = machine_pool
+        self._time_budget_seconds = time_budget_seconds
+        self._seed = seed
+        self._max_delay_days = max_delay_days
+        self._delay_weight = delay_weight
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+        return self
+
+    def run(self):
+        try:
+            snapshot = self._machine_calendar.copy()
+            # copies keep the version of the calendar they were taken from
+            snapshot_version = snapshot.version
+            self.result = Optimizer(
+                snapshot,
+                self._machine_pool,
+                self._time_budget_seconds,
+                seed=self._seed,
+                max_delay_days=self._max_delay_days,
+                delay_weight=self._delay_weight,
+            ).run()
+        except Exception as e:
+            self.error = str(e)
+            self.status = JOB_FAILED
+            return
+
+        if not self.result.moves or self.result.improvement <= 0:
+            self.status = JOB_DISCARDED
+        elif self._machine_calendar.replace(snapshot, snapshot_version):
+            self.status = JOB_SWAPPED
+        else:
+            self.status = JOB_STALE
+
+    def detail(self) -> str:
+        """What became of the shared calendar, in words."""
+        if self.status == JOB_RUNNING:
+            return "Optimizing, the shared calendar is unchanged so far"
+        if self.status == JOB_SWAPPED:
+            return (
+                f"Applied {self.result.moves} moves to the shared calendar, "
+                f"{self.result.delayed_courses} courses start later than booked "
+                f"by {self.result.delay_days} days in total"
+            )
+        if self.status == JOB_DISCARDED:
+            return "Nothing applied, no better schedule was found"
+        if self.status == JOB_STALE:
+            return "Nothing applied, the calendar changed while optimizing"
+        return "Nothing applied, the optimization failed"
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "applied": self.status == JOB_SWAPPED,
+            "detail": self.detail(),
+            "result": self.result.to_dict() if self.result else None,
+            "error": self.error,
+        }
+
+
+class JobRegistry:
+    """The latest ``max_jobs`` jobs by id."""
+
+    def __init__(self, max_jobs: int = 100):
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[int, OptimizationJob]" = OrderedDict()
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def next_id(self) -> int:
+        with self._lock:
+            job_id = self._next_id
+            self._next_id += 1
+            return job_id
+
+    def add(self, job: OptimizationJob) -> OptimizationJob:
+        with self._lock:
+            self._jobs[job.job_id] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        return job
+
+    def get(self, job_id: int) -> OptimizationJob:
+        try:
+            return self._jobs[job_id]
+        except KeyError:
+            raise JobNotFound(job_id)
@@ -1,9 +1,16 @@
-from typing import List, TypeVar, Generic
+from typing import List, TypeVar, Generic, Optional
 
 from pydantic import BaseModel, Field
 from pydantic.v1.generics import GenericModel
 
-from scheduling.constants import MACHINE_TYPES
+from scheduling.constants import (
+    MACHINE_TYPES,
+    BATCH_ORDERINGS,
+    ORDER_ARRIVAL,
+    JOB_STATUSES,
+    OPTIMIZER_MAX_DELAY_DAYS,
+    OPTIMIZER_DELAY_WEIGHT,
+)
 from scheduling.diseases import CANCER_MAP
 
 
@@ -16,6 +23,34 @@ class MakeAppointmentRequest(BaseModel):
 class MakeAppointmentResponse(BaseModel):
     machine_name: str = Field(enum=MACHINE_TYPES)
     shift: int
+    appointment_id: Optional[int] = None
+    start_minute: Optional[int] = None
+
+
+class MakeBatchAppointmentRequest(BaseModel):
+    items: List[MakeAppointmentRequest]
+    ordering: str = Field(
+        ORDER_ARRIVAL,
+        enum=BATCH_ORDERINGS,
+        description="Order in which patients are placed on the calendar",
+    )
+
+
+class BatchAppointment(BaseModel):
+    name: str
+    machine_name: Optional[str] = Field(None, enum=MACHINE_TYPES)
+    shift: Optional[int] = None
+    appointment_id: Optional[int] = None
+    start_minute: Optional[int] = None
+    error: Optional[str] = Field(
+        None, description="Reason why the patient wasn't scheduled"
+    )
+
+
+class MakeBatchAppointmentResponse(BaseModel):
+    items: List[BatchAppointment]
+    scheduled: int
+    failed: int
 
 
 class MachineLoad(BaseModel):
@@ -28,6 +63,21 @@ class GetLoadResponse(BaseModel):
     average_load: float
 
 
+class GetLoadRangeResponse(BaseModel):
+    machines: List[str]
+    shifts: List[int] = Field(description="First shift of every row")
+    load: List[List[float]] = Field(
+        description="Utilization percentage, one row per shift, one column per machine"
+    )
+    average_load: List[float]
+
+
+class CalendarModel(BaseModel):
+    current_day: int = Field(description="Calendar day of shift 0")
+    calendar_length_days: int
+    version: int
+
+
 class CancerModel(BaseModel):
     name: str
     probability: float
@@ -57,3 +107,57 @@ class MachineModel(BaseModel):
         description="Sum of the probabilities to treat cancers"
     )
     available_treatments: List[CancerModel]
+
+
+class AppointmentModel(BaseModel):
+    appointment_id: int
+    patient_name: str
+    cancer_type: str
+    machine_name: str = Field(enum=MACHINE_TYPES)
+    start_day: int = Field(
+        description="Calendar day of the first fraction, see /calendar for today"
+    )
+    days: int
+    treatment_time_minutes: int
+    start_minute: Optional[int] = Field(
+        None, description="Minute of the day every fraction starts at"
+    )
+
+
+class OptimizeRequest(BaseModel):
+    time_budget_seconds: float = Field(1.0, gt=0, le=60)
+    seed: Optional[int] = None
+    max_delay_days: int = Field(
+        OPTIMIZER_MAX_DELAY_DAYS,
+        ge=0,
+        description="How much later than booked a course may start",
+    )
+    delay_weight: float = Field(
+        OPTIMIZER_DELAY_WEIGHT,
+        ge=0,
+        description="Cost of a day of delay, in the variance one course adds a day",
+    )
+
+
+class OptimizationResultModel(BaseModel):
+    iterations: int
+    moves: int
+    variance_before: float = Field(
+        description="Utilization variance across machines, averaged over days"
+    )
+    variance_after: float
+    improvement: float
+    delayed_courses: int = Field(description="Courses starting later than booked")
+    delay_days: int = Field(description="Days of delay summed over those courses")
+    seconds: float
+
+
+class OptimizationJobModel(BaseModel):
+    job_id: int
+    status: str = Field(enum=JOB_STATUSES)
+    applied: bool = Field(
+        description="Whether the optimized schedule replaced the shared calendar"
+    )
+    detail: str
+    result: Optional[OptimizationResultModel] = None
+    error: Optional[str] = None
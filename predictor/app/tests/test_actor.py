@@ -0,0 +1,78 @@
+import asyncio
+import random
+import threading
+
+from scheduling.calendar import MachineCalendar
+from scheduling.locks import SharedLock
+from scheduling.patients import PatientGen
+from scheduling.scheduler import ExtendScheduleError
+from scheduling.stress import check_consistency
+from scheduling.utils import build_machine_pool
+from server.actor import SchedulingActor
+
+
+def test_exclusive_holder_takes_the_lock_again():
+    lock = SharedLock()
+    entered = threading.Event()
+
+    def read():
+        with lock.shared():
+            entered.set()
+
+    with lock.exclusive():
+        with lock.shared(), lock.exclusive():
+            assert lock.held_exclusive()
+        reader = threading.Thread(target=read)
+        reader.start()
+        # other threads still wait for the outermost release
+        assert not entered.wait(0.05)
+    reader.join()
+    assert entered.is_set()
+    assert not lock.held_exclusive()
+
+
+def test_actor_passes_stay_consistent_with_snapshots_between_them():
+    machine_pool = build_machine_pool()
+    machine_calendar = MachineCalendar(machine_pool, 30, max_calendar_length_days=120)
+    rng = random.Random(0)
+    patient_generator = PatientGen(rng).get_patient()
+    patients = []
+    for _ in range(300):
+        patient = next(patient_generator)
+        patient.assign_random_fraction_time(rng)
+        patients.append(patient)
+
+    snapshots = []
+    done = threading.Event()
+
+    def snapshot():
+        # copies lock the calendar exclusive, so they fall between passes
+        while not done.wait(0.01):
+            snapshots.append(machine_calendar.copy())
+
+    async def book_all():
+        actor = await SchedulingActor(machine_calendar, machine_pool).start()
+        try:
+            bookings = [actor.book(patient) for patient in patients]
+            bookings.insert(150, actor.call(machine_calendar.advance, 2))
+            return await asyncio.gather(*bookings, return_exceptions=True)
+        finally:
+            await actor.stop()
+
+    copier = threading.Thread(target=snapshot)
+    copier.start()
+    try:
+        outcomes = asyncio.run(book_all())
+    finally:
+        done.set()
+        copier.join()
+
+    for outcome in outcomes:
+        if isinstance(outcome, Exception):
+            assert isinstance(outcome, ExtendScheduleError)
+    assert machine_calendar.current_day == 2
+    assert len(machine_calendar.ledger) > 0
+    for calendar in snapshots + [machine_calendar]:
+        for period in calendar.calendar.values():
+            assert (period.free_minutes() >= 0).all()
+        check_consistency(calendar)
@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from scheduling.capacity_index import CapacityIndex
+
+
+def first_below(values, start, stop, threshold):
+    return next((p for p in range(start, stop) if values[p] < threshold), -1)
+
+
+def last_below(values, start, stop, threshold):
+    return next((p for p in reversed(range(start, stop)) if values[p] < threshold), -1)
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 64, 100])
+def test_matches_a_list_under_random_operations(size):
+    rng = random.Random(size)
+    values = [rng.randrange(0, 480) for _ in range(size)]
+    index = CapacityIndex(values)
+    assert len(index) == size
+
+    for _ in range(2000):
+        start = rng.randrange(size)
+        stop = rng.randrange(start, size + 1)
+        operation = rng.random()
+        if operation < 0.4:
+            value = rng.randrange(-60, 61)
+            index.add(start, stop, value)
+            for position in range(start, stop):
+                values[position] += value
+        elif operation < 0.5:
+            values[start] = rng.randrange(0, 480)
+            index.set(start, values[start])
+        else:
+            threshold = rng.randrange(-100, 600)
+            assert index.first_below(start, stop, threshold) == first_below(
+                values, start, stop, threshold
+            )
+            assert index.last_below(start, stop, threshold) == last_below(
+                values, start, stop, threshold
+            )
+
+    for position in range(size):
+        # a one-position range below value + 1 finds exactly that position
+        assert index.first_below(position, position + 1, values[position] + 1) == (
+            position
+        )
+        assert index.first_below(position, position + 1, values[position]) == -1
+
+
+def test_empty_ranges_find_nothing():
+    index = CapacityIndex([0, 0, 0])
+
+    assert index.first_below(2, 2, 1) == -1
+    assert index.last_below(1, 1, 1) == -1
+    assert index.add(1, 1, 5).first_below(0, 3, 1) == 0
@@ -0,0 +1,84 @@
+import random
+import threading
+
+import pytest
+
+from scheduling.calendar import MachineCalendar
+from scheduling.patients import PatientGen
+from scheduling.scheduler import ExtendScheduleError, Scheduler
+from scheduling.stress import OverbookedError, check_consistency, stress
+from scheduling.utils import build_machine_pool
+
+
+def book_concurrently(machine_calendar, machine_pool, threads=8, patients=60):
+    errors = []
+    start = threading.Barrier(threads)
+
+    def book(worker: int):
+        rng = random.Random(worker)
+        patient_generator = PatientGen(rng).get_patient()
+        scheduler = Scheduler(
+            machine_calendar.calendar_length_days, machine_pool, None, machine_calendar
+        )
+        start.wait()
+        try:
+            booked = []
+            for _ in range(patients):
+                patient = next(patient_generator)
+                patient.assign_random_fraction_time(rng)
+                try:
+                    booked.append(scheduler.book_patient(patient))
+                except ExtendScheduleError:
+                    continue
+                if rng.random() < 0.2:
+                    appointment = booked.pop(rng.randrange(len(booked)))
+                    machine_calendar.cancel(appointment.appointment_id)
+        except BaseException as e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=book, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    if errors:
+        raise errors[0]
+
+
+@pytest.mark.parametrize("slotted", [False, True])
+def test_concurrent_bookings_never_overbook(slotted):
+    machine_pool = build_machine_pool()
+    # short enough that threads compete for the same days
+    machine_calendar = MachineCalendar(
+        machine_pool, 30, max_calendar_length_days=120, slotted=slotted
+    )
+
+    book_concurrently(machine_calendar, machine_pool)
+
+    assert len(machine_calendar.ledger) > 0
+    for period in machine_calendar.calendar.values():
+        assert (period.free_minutes() >= 0).all()
+    check_consistency(machine_calendar)
+
+
+def test_check_consistency_detects_minutes_outside_the_ledger():
+    machine_pool = build_machine_pool()
+    machine_calendar = MachineCalendar(machine_pool, 30)
+    machine = machine_calendar.sorted_machines()[0]
+    machine_calendar[machine].allocate(2, 60, 3)
+
+    with pytest.raises(OverbookedError):
+        check_consistency(machine_calendar)
+
+
+def test_stress_with_advances_stays_consistent():
+    summary = stress(
+        threads=4,
+        patients_per_thread=40,
+        period_length_days=30,
+        max_period_length_days=120,
+        advance_days=3,
+    )
+
+    assert summary["booked"] > 0
+    assert summary["current_day"] == 3
@@ -0,0 +1,109 @@
+import random
+
+import numpy as np
+import pytest
+
+from scheduling.calendar import AllocationError, NotEnoughDaysError, Period
+
+DAY_LENGTH = 480
+
+
+def first_fit(days, length, minutes, start=0, stop=None):
+    last_shift = len(days) - length
+    stop = last_shift + 1 if stop is None else min(stop, last_shift + 1)
+    return next(
+        (
+            shift
+            for shift in range(start, stop)
+            if min(days[shift : shift + length]) >= minutes
+        ),
+        -1,
+    )
+
+
+def assert_matches(period, days):
+    assert period.period_length_days == len(days)
+    assert period.free_minutes().tolist() == days
+    assert [period.time_left(day) for day in range(len(days))] == days
+    assert period.free_minutes_total == sum(days)
+    assert period.busy_days == sum(minutes < DAY_LENGTH // 2 for minutes in days)
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_ring_matches_a_list_under_random_operations(indexed):
+    rng = random.Random(int(indexed))
+    period = Period(30, DAY_LENGTH, indexed=indexed)
+    # day 0 is the current day, like the period's own view
+    days = [DAY_LENGTH] * 30
+
+    for _ in range(3000):
+        length = rng.randint(1, 10)
+        minutes = rng.choice([15, 30, 60, 120, 240])
+        shift = rng.randrange(len(days) - length + 1)
+        operation = rng.random()
+        if operation < 0.45:
+            fits = min(days[shift : shift + length]) >= minutes
+            assert period.can_allocate(length, minutes, shift) == fits
+            if fits:
+                period.allocate(length, minutes, shift)
+                for day in range(shift, shift + length):
+                    days[day] -= minutes
+            else:
+                with pytest.raises(AllocationError):
+                    period.allocate(length, minutes, shift)
+        elif operation < 0.7:
+            # releases clamp at the day length
+            period.release(length, minutes, shift)
+            for day in range(shift, shift + length):
+                days[day] = min(days[day] + minutes, DAY_LENGTH)
+        elif operation < 0.8:
+            advanced = rng.choice([1, 2, 7, 29, 30, 45])
+            period.advance(advanced)
+            days = days[advanced:] + [DAY_LENGTH] * min(advanced, len(days))
+        elif operation < 0.82 and len(days) < 120:
+            grown = len(days) + rng.randint(1, 20)
+            period.extend(grown)
+            days += [DAY_LENGTH] * (grown - len(days))
+        else:
+            start = rng.randrange(len(days))
+            stop = rng.choice([None, rng.randrange(start, len(days) + 1)])
+            assert period.first_fit(length, minutes, start, stop) == first_fit(
+                days, length, minutes, start, stop
+            )
+        assert_matches(period, days)
+
+
+def test_free_minutes_wraps_around_the_ring():
+    period = Period(10, DAY_LENGTH)
+    period.allocate(10, 60)
+    period.advance(7)
+    period.allocate(5, 30, 1)
+
+    assert period.origin == 7
+    assert period.free_minutes(1, 6).tolist() == [390, 390, 450, 450, 450]
+    assert period.free_minutes(2, 5).tolist() == [390, 450, 450]
+
+
+def test_take_is_all_or_nothing():
+    period = Period(10, DAY_LENGTH, indexed=True)
+    period.advance(6)
+    period.allocate(4, 400, 2)
+    before = period.free_minutes().copy()
+
+    with pytest.raises(AllocationError):
+        period.take(np.array([10, 10, 100, 10], dtype=np.int64))
+    assert (period.free_minutes() == before).all()
+
+    period.take(np.array([10, -20, 60], dtype=np.int64))
+    assert period.free_minutes()[:3].tolist() == [470, DAY_LENGTH, 20]
+    assert period.free_minutes_total == int(period.free_minutes().sum())
+    assert period.first_fit(3, 30) == 3
+
+
+def test_windows_past_the_end_raise():
+    period = Period(10, DAY_LENGTH)
+
+    with pytest.raises(NotEnoughDaysError):
+        period.can_allocate(5, 30, 6)
+    with pytest.raises(NotEnoughDaysError):
+        period.release(5, 30, 6)
@@ -0,0 +1,95 @@
+import random
+
+import numpy as np
+import pytest
+
+from scheduling.calendar import Period
+from scheduling.slots import SlotError, SlotIndex
+
+DAY_LENGTH = 480
+
+
+def first_free(busy, first_day, days, minutes):
+    window = busy[first_day : first_day + days].any(axis=0)
+    for start in range(DAY_LENGTH - minutes + 1):
+        if not window[start : start + minutes].any():
+            return start
+    return None
+
+
+def largest_gap(busy_day):
+    largest = run = 0
+    for taken in busy_day:
+        run = 0 if taken else run + 1
+        largest = max(largest, run)
+    return largest
+
+
+def test_slot_index_matches_minute_masks():
+    rng = random.Random(0)
+    slots = SlotIndex(DAY_LENGTH)
+    # one flag per booked minute of every day
+    busy = np.zeros((20, DAY_LENGTH), dtype=bool)
+    booked = []
+
+    for _ in range(1500):
+        days = rng.randint(1, 6)
+        first_day = rng.randrange(20 - days + 1)
+        minutes = rng.choice([10, 15, 30, 45, 90])
+        operation = rng.random()
+        if operation < 0.5:
+            start = first_free(busy, first_day, days, minutes)
+            assert slots.first_free(first_day, days, minutes) == start
+            if start is not None:
+                slots.book(first_day, days, start, minutes)
+                busy[first_day : first_day + days, start : start + minutes] = True
+                booked.append((first_day, days, start, minutes))
+        elif operation < 0.75 and booked:
+            first_day, days, start, minutes = booked.pop(rng.randrange(len(booked)))
+            slots.free(first_day, days, start, minutes)
+            busy[first_day : first_day + days, start : start + minutes] = False
+        else:
+            start = rng.randrange(-10, DAY_LENGTH)
+            window = busy[first_day : first_day + days, max(start, 0) : start + minutes]
+            expected = 0 <= start <= DAY_LENGTH - minutes and not window.any()
+            assert slots.is_free(first_day, days, start, minutes) == expected
+
+        for day in range(first_day, first_day + days):
+            assert slots.largest_gap(day) == largest_gap(busy[day])
+
+    for day in range(20):
+        assert slots.largest_gap(day) == largest_gap(busy[day])
+
+
+def test_freeing_an_unbooked_slot_raises():
+    slots = SlotIndex(DAY_LENGTH)
+    slots.book(3, 2, 60, 30)
+
+    with pytest.raises(SlotError):
+        slots.free(3, 2, 60, 45)
+    with pytest.raises(SlotError):
+        slots.free(3, 3, 60, 30)
+
+
+def test_retired_days_are_forgotten():
+    slots = SlotIndex(DAY_LENGTH)
+    slots.book(0, 5, 0, DAY_LENGTH)
+    slots.retire(0, 3)
+
+    assert slots.day(2) is None
+    assert slots.first_free(0, 3, DAY_LENGTH) == 0
+    assert slots.first_free(0, 4, 1) is None
+
+
+def test_slotted_period_keeps_gaps_across_advances():
+    period = Period(10, DAY_LENGTH, slotted=True)
+    assert period.allocate_slot(4, 120, 2) == 0
+    assert period.allocate_slot(4, 120, 3) == 120
+    period.advance(3)
+
+    # both courses share days 0..2 now, the second one runs one day longer
+    assert period.largest_gaps(0, 4).tolist() == [240, 240, 240, 240]
+    assert period.first_free_slot(2, 240) == 240
+    period.release_slot(4, 120, 0, 120)
+    assert period.largest_gaps(0, 4).tolist() == [360, 360, 360, DAY_LENGTH]
+    assert period.free_minutes(0, 4).tolist() == [360, 360, 360, DAY_LENGTH]
@@ -0,0 +1,102 @@
+import os
+import random
+
+from scheduling.constants import DAY_LENGTH_MINUTES
+from scheduling.patients import PatientGen
+from scheduling.scheduler import ExtendScheduleError, Scheduler
+from scheduling.utils import build_machine_pool
+from scheduling.wal import AllocationLog
+
+
+def free_minutes_matrix(machine_calendar, days):
+    return machine_calendar.free_minutes_matrix(
+        machine_calendar.sorted_machines(), days
+    )
+
+
+def book_and_cancel(machine_calendar, machine_pool, bookings=350, cancels=50):
+    rng = random.Random(0)
+    patient_generator = PatientGen(rng).get_patient()
+    scheduler = Scheduler(
+        machine_calendar.calendar_length_days, machine_pool, None, machine_calendar
+    )
+    booked = []
+    for _ in range(bookings):
+        patient = next(patient_generator)
+        patient.assign_random_fraction_time(rng)
+        try:
+            booked.append(scheduler.book_patient(patient))
+        except ExtendScheduleError:
+            continue
+        machine_calendar.sync()
+    for appointment in rng.sample(booked, cancels):
+        machine_calendar.cancel(appointment.appointment_id)
+    machine_calendar.advance(3)
+    machine_calendar.sync()
+
+
+def assert_recovers(machine_calendar, directory, machine_pool):
+    recovered = AllocationLog.recover(directory, machine_pool, 60, 240)
+    days = min(
+        machine_calendar.calendar_length_days, recovered.calendar_length_days
+    )
+
+    assert recovered.current_day == machine_calendar.current_day
+    # a change lost before its fsync may have been served, its version isn't reused
+    assert recovered.version > machine_calendar.version
+    assert (
+        free_minutes_matrix(recovered, days)
+        == free_minutes_matrix(machine_calendar, days)
+    ).all()
+    return recovered
+
+
+def test_recover_replays_bookings_cancels_and_advances(tmp_path):
+    directory = str(tmp_path / "log")
+    machine_pool = build_machine_pool()
+    machine_calendar = AllocationLog.recover(directory, machine_pool, 60, 240)
+
+    book_and_cancel(machine_calendar, machine_pool)
+
+    assert_recovers(machine_calendar, directory, machine_pool)
+
+
+def test_checkpoints_bound_the_log(tmp_path):
+    directory = str(tmp_path / "log")
+    machine_pool = build_machine_pool()
+    machine_calendar = AllocationLog.recover(
+        directory, machine_pool, 60, 240, checkpoint_records=50
+    )
+
+    book_and_cancel(machine_calendar, machine_pool)
+
+    assert machine_calendar.log.segment > 1
+    segments = [name for name in os.listdir(directory) if name.startswith("segment")]
+    assert len(segments) == 1
+    assert_recovers(machine_calendar, directory, machine_pool)
+
+
+def test_torn_tail_record_is_ignored(tmp_path):
+    directory = str(tmp_path / "log")
+    machine_pool = build_machine_pool()
+    machine_calendar = AllocationLog.recover(directory, machine_pool, 60, 240)
+    book_and_cancel(machine_calendar, machine_pool, bookings=40, cancels=5)
+
+    segment = os.path.join(
+        directory, f"segment-{machine_calendar.log.segment:08d}.log"
+    )
+    with open(segment, "ab") as file:
+        file.write(b"\x01" * 20)
+
+    assert_recovers(machine_calendar, directory, machine_pool)
+
+
+def test_recovery_without_a_log_starts_empty(tmp_path):
+    machine_pool = build_machine_pool()
+    machine_calendar = AllocationLog.recover(
+        str(tmp_path / "log"), machine_pool, 60, 240
+    )
+
+    assert machine_calendar.current_day == 0
+    assert (free_minutes_matrix(machine_calendar, 60) == DAY_LENGTH_MINUTES).all()
+    assert isinstance(machine_calendar.log, AllocationLog)
@@ -1,22 +1,70 @@
-from fastapi import Depends, HTTPException
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import json
+import logging
+import os
+import time
+
+from fastapi import Depends, HTTPException, Query, Request
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.cors import CORSMiddleware
-from starlette.responses import HTMLResponse
+from starlette.responses import Response, StreamingResponse
 
-from scheduling.calendar import NotEnoughDaysError
-from scheduling.constants import TWO_YEAR_LEN_DAYS
+from scheduling.appointments import AppointmentNotFound
+from scheduling.calendar import (
+    MachineCalendar,
+    InvalidDayError,
+    NotEnoughDaysError,
+    UnknownMachineError,
+    InvalidResolutionError,
+)
+from scheduling.constants import (
+    TWO_YEAR_LEN_DAYS,
+    FIVE_YEAR_LEN_DAYS,
+    LOAD_RESOLUTIONS,
+    RESOLUTION_DAY,
+)
 from scheduling.diseases import CANCER_MAP
+from scheduling.metrics import (
+    CONTENT_TYPE,
+    HTTP_REQUEST_SECONDS,
+    REGISTRY,
+    observe_calendar,
+)
 from scheduling.machine_pool import MachinePool
 from scheduling.patients import Patient, InvalidFractionTime, PatientGen
+from scheduling.priority import InvalidOrdering
+from scheduling.reports import (
+    COMPRESSION_GZIP,
+    COMPRESSION_NONE,
+    FORMAT_HTML,
+    MEDIA_TYPES,
+    REPORT_COMPRESSIONS,
+    REPORT_FORMATS,
+    InvalidReportCompression,
+    InvalidReportFormat,
+)
 from scheduling.scheduler import Scheduler, ExtendScheduleError
 from scheduling.utils import (
     get_machine_pool,
     get_machine_calendar,
     get_patient_generator,
 )
+from server.actor import SchedulingActor
+from server.cache import ResponseCache, etag_matches
+from server.jobs import JobNotFound, JobRegistry, OptimizationJob
 from server.models import (
+    AppointmentModel,
+    CalendarModel,
     MakeAppointmentRequest,
     MakeAppointmentResponse,
+    MakeBatchAppointmentRequest,
+    MakeBatchAppointmentResponse,
     GetLoadResponse,
+    OptimizationJobModel,
+    OptimizeRequest,
+    GetLoadRangeResponse,
     PatientModel,
     CancerModel,
     PagedResponse,
@@ -24,7 +72,41 @@ from server.models import (
 
 from fastapi import FastAPI
 
-app = FastAPI()
+# SLOTTED_CALENDAR=1 gives every appointment a start minute
+SLOTTED_CALENDAR = os.environ.get("SLOTTED_CALENDAR") == "1"
+# SCHEDULING_ACTOR=1 sends every change of the calendar through one writer
+SCHEDULING_ACTOR = os.environ.get("SCHEDULING_ACTOR") == "1"
+# CALENDAR_PATH keeps the free minutes in a memory-mapped file across restarts
+CALENDAR_PATH = os.environ.get("CALENDAR_PATH") or None
+# SHARED_CALENDAR=1 makes the file one calendar for every worker process
+SHARED_CALENDAR = os.environ.get("SHARED_CALENDAR") == "1"
+if SHARED_CALENDAR and (CALENDAR_PATH is None or SLOTTED_CALENDAR):
+    raise RuntimeError("SHARED_CALENDAR=1 needs a CALENDAR_PATH, without slots")
+# CALENDAR_LOG_DIR logs every change and rebuilds the calendar from it at startup
+CALENDAR_LOG_DIR = os.environ.get("CALENDAR_LOG_DIR") or None
+if CALENDAR_LOG_DIR is not None and (CALENDAR_PATH is not None or SLOTTED_CALENDAR):
+    raise RuntimeError("CALENDAR_LOG_DIR can't be combined with CALENDAR_PATH or slots")
+scheduling_actor: Optional[SchedulingActor] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global scheduling_actor
+    if SCHEDULING_ACTOR:
+        machine_pool = get_machine_pool()
+        scheduling_actor = await SchedulingActor(
+            machine_calendar_for(machine_pool), machine_pool
+        ).start()
+    try:
+        yield
+    finally:
+        if scheduling_actor is not None:
+            await scheduling_actor.stop()
+            scheduling_actor = None
+        machine_calendar_for(get_machine_pool()).flush()
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -33,41 +115,333 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "WARNING").upper())
+
+response_cache = ResponseCache()
+optimization_jobs = JobRegistry()
+
+
+@app.middleware("http")
+async def observe_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # the route template keeps path parameters out of the labels
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.observe(
+        time.perf_counter() - started,
+        method=request.method,
+        route=route.path if route else "unmatched",
+        status=response.status_code,
+    )
+    return response
+
+
+def machine_calendar_for(machine_pool: MachinePool) -> MachineCalendar:
+    """Shared calendar, starts at two years and grows up to five on demand.
+
+    A calendar shared by worker processes has the five years from the start.
+    """
+    return get_machine_calendar(
+        machine_pool,
+        TWO_YEAR_LEN_DAYS,
+        FIVE_YEAR_LEN_DAYS,
+        SLOTTED_CALENDAR,
+        CALENDAR_PATH,
+        SHARED_CALENDAR,
+        CALENDAR_LOG_DIR,
+    )
+
+
+async def current_machine_pool() -> MachinePool:
+    """``get_machine_pool`` for async endpoints, sync dependencies cost a thread hop."""
+    return get_machine_pool()
+
+
+def scheduler_for(machine_pool: MachinePool) -> Scheduler:
+    machine_calendar = machine_calendar_for(machine_pool)
+    return Scheduler(
+        period_length_days=machine_calendar.calendar_length_days,
+        machine_pool=machine_pool,
+        patient_generator=None,
+        machine_calendar=machine_calendar,
+    )
+
+
+async def change_calendar(function: Callable, *args):
+    """Run a change on the scheduling actor, or on the threadpool without one."""
+    if scheduling_actor is not None:
+        return await scheduling_actor.call(function, *args)
+    return await run_in_threadpool(function, *args)
+
+
+async def make_durable(machine_calendar: MachineCalendar):
+    """Answer a change only once it is in the log on disk.
+
+    Runs off the actor, concurrent requests share one fsync.
+    """
+    if machine_calendar.log is not None:
+        await run_in_threadpool(machine_calendar.sync)
+
+
+async def cached_response(
+    request: Request,
+    endpoint: str,
+    params: Tuple,
+    render: Callable,
+    media_type: str = "application/json",
+    headers: Optional[Dict[str, str]] = None,
+    streamed: bool = False,
+):
+    """Serve a read endpoint from the cache, 304 if the client is up to date.
+
+    A ``streamed`` render returns the body in chunks and runs in the
+    threadpool; an uncached body is streamed to the client while it is
+    cached, so a large report never sits in memory in full.
+    """
+    machine_calendar = machine_calendar_for(get_machine_pool())
+    key = response_cache.key(endpoint, params, machine_calendar.version)
+    etag = response_cache.etag(key)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    headers = {"ETag": etag, **(headers or {})}
+    body = response_cache.get(key)
+    if body is None and streamed:
+        chunks = await run_in_threadpool(render)
+        return StreamingResponse(
+            response_cache.tee(key, chunks), media_type=media_type, headers=headers
+        )
+    if body is None:
+        body = render()
+        response_cache.put(key, body)
+    return Response(body, media_type=media_type, headers=headers)
+
+
+def render_json(data) -> bytes:
+    return json.dumps(data).encode()
+
 
 @app.post("/schedule", response_model=MakeAppointmentResponse)
-def get_availability(
+async def get_availability(
     request: MakeAppointmentRequest,
-    machine_pool=Depends(get_machine_pool),
+    machine_pool=Depends(current_machine_pool),
 ):
     try:
         patient = Patient.from_model(request)
     except InvalidFractionTime as e:
         raise HTTPException(422, detail=str(e))
 
-    machine_calendar = get_machine_calendar(machine_pool, TWO_YEAR_LEN_DAYS)
-    scheduler = Scheduler(
-        period_length_days=365,
-        machine_pool=machine_pool,
-        patient_generator=None,
-        machine_calendar=machine_calendar,
-    )
+    machine_calendar = machine_calendar_for(machine_pool)
     try:
-        machine, shift = scheduler.process_patient(patient)
-        return {"machine_name": machine.name(), "shift": shift}
+        if scheduling_actor is not None:
+            # coalesced with the bookings arriving at the same time
+            appointment = await scheduling_actor.book(patient)
+        else:
+            appointment = await run_in_threadpool(
+                scheduler_for(machine_pool).book_patient, patient
+            )
+        await make_durable(machine_calendar)
+        return {
+            "machine_name": appointment.machine.name(),
+            "shift": machine_calendar.shift_of(appointment),
+            "appointment_id": appointment.appointment_id,
+            "start_minute": appointment.start_minute,
+        }
 
     except ExtendScheduleError:
         raise HTTPException(status_code=404, detail="Can't schedule appointment")
 
 
+@app.post("/schedule/batch", response_model=MakeBatchAppointmentResponse)
+async def schedule_batch(
+    request: MakeBatchAppointmentRequest,
+    machine_pool=Depends(current_machine_pool),
+):
+    items = [{"name": item.name} for item in request.items]
+    patients, positions = [], []
+    for position, item in enumerate(request.items):
+        if item.cancer_type not in CANCER_MAP:
+            items[position]["error"] = f"Unknown cancer type {item.cancer_type}"
+            continue
+        try:
+            patients.append(Patient.from_model(item))
+        except InvalidFractionTime as e:
+            items[position]["error"] = str(e)
+            continue
+        positions.append(position)
+
+    machine_calendar = machine_calendar_for(machine_pool)
+    try:
+        appointments = await change_calendar(
+            scheduler_for(machine_pool).process_batch, patients, request.ordering
+        )
+    except InvalidOrdering as e:
+        raise HTTPException(422, detail=str(e))
+    await make_durable(machine_calendar)
+
+    for position, appointment in zip(positions, appointments):
+        if appointment is None:
+            items[position]["error"] = "Can't schedule appointment"
+            continue
+        items[position].update(
+            machine_name=appointment.machine.name(),
+            shift=machine_calendar.shift_of(appointment),
+            appointment_id=appointment.appointment_id,
+            start_minute=appointment.start_minute,
+        )
+
+    scheduled = sum(1 for appointment in appointments if appointment is not None)
+    return {
+        "items": items,
+        "scheduled": scheduled,
+        "failed": len(items) - scheduled,
+    }
+
+
+@app.get("/calendar", response_model=CalendarModel)
+def get_calendar(machine_pool=Depends(get_machine_pool)):
+    machine_calendar = machine_calendar_for(machine_pool)
+    return {
+        "current_day": machine_calendar.current_day,
+        "calendar_length_days": machine_calendar.calendar_length_days,
+        "version": machine_calendar.version,
+    }
+
+
+@app.post("/calendar/advance", response_model=CalendarModel)
+async def advance_calendar(
+    days: Optional[int] = None,
+    to_day: Optional[int] = None,
+    machine_pool=Depends(current_machine_pool),
+):
+    """Move the current day forward by ``days`` or to calendar day ``to_day``."""
+    if (days is None) == (to_day is None):
+        raise HTTPException(422, detail="Pass either days or to_day")
+
+    machine_calendar = machine_calendar_for(machine_pool)
+    try:
+        if days is not None:
+            await change_calendar(machine_calendar.advance, days)
+        else:
+            await change_calendar(machine_calendar.advance_to, to_day)
+    except InvalidDayError as e:
+        raise HTTPException(422, detail=str(e))
+    # a day boundary is a natural point to make the storage and log durable
+    await change_calendar(machine_calendar.flush)
+    return get_calendar(machine_pool)
+
+
+@app.get("/appointments", response_model=PagedResponse[AppointmentModel])
+def get_appointments(
+    patient_name: Optional[str] = None,
+    machine_name: Optional[str] = None,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    offset: int = 0,
+    limit: int = 100,
+    machine_pool=Depends(get_machine_pool),
+):
+    machine_calendar = machine_calendar_for(machine_pool)
+    appointments = machine_calendar.ledger.find(patient_name, machine_name, start, end)
+    return {
+        "items": [
+            appointment.to_dict()
+            for appointment in appointments[offset : offset + limit]
+        ],
+        "total": len(appointments),
+    }
+
+
+@app.get("/appointments/{appointment_id}", response_model=AppointmentModel)
+def get_appointment(appointment_id: int, machine_pool=Depends(get_machine_pool)):
+    machine_calendar = machine_calendar_for(machine_pool)
+    try:
+        return machine_calendar.ledger.get(appointment_id).to_dict()
+    except AppointmentNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.delete("/appointments/{appointment_id}", response_model=AppointmentModel)
+async def cancel_appointment(
+    appointment_id: int, machine_pool=Depends(current_machine_pool)
+):
+    machine_calendar = machine_calendar_for(machine_pool)
+    try:
+        appointment = await change_calendar(machine_calendar.cancel, appointment_id)
+        await make_durable(machine_calendar)
+        return appointment.to_dict()
+    except AppointmentNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.post("/optimize", response_model=OptimizationJobModel, status_code=202)
+def optimize(request: OptimizeRequest, machine_pool=Depends(get_machine_pool)):
+    """Rebalance appointments that haven't started in the background.
+
+    Poll ``/optimize/{job_id}``, the shared calendar is replaced when the job
+    finds a better one and nothing was booked meanwhile.
+    """
+    job = OptimizationJob(
+        optimization_jobs.next_id(),
+        machine_calendar_for(machine_pool),
+        machine_pool,
+        request.time_budget_seconds,
+        request.seed,
+        request.max_delay_days,
+        request.delay_weight,
+    )
+    return optimization_jobs.add(job).start().to_dict()
+
+
+@app.get("/optimize/{job_id}", response_model=OptimizationJobModel)
+def get_optimization(job_id: int):
+    try:
+        return optimization_jobs.get(job_id).to_dict()
+    except JobNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
 @app.get("/load", response_model=GetLoadResponse)
-def get_load(shift: int, machine_pool=Depends(get_machine_pool)):
-    machine_calendar = get_machine_calendar(machine_pool, TWO_YEAR_LEN_DAYS)
+async def get_load(
+    request: Request, shift: int, machine_pool=Depends(current_machine_pool)
+):
+    machine_calendar = machine_calendar_for(machine_pool)
     try:
-        return machine_calendar.get_daily_load(shift)
+        return await cached_response(
+            request,
+            "load",
+            (shift,),
+            lambda: render_json(machine_calendar.get_daily_load(shift)),
+        )
     except NotEnoughDaysError:
         raise HTTPException(status_code=422, detail="Invalid skew")
 
 
+@app.get("/load/range", response_model=GetLoadRangeResponse)
+async def get_load_range(
+    request: Request,
+    start: int,
+    end: int,
+    machines: Optional[List[str]] = Query(None),
+    resolution: str = Query(RESOLUTION_DAY, enum=list(LOAD_RESOLUTIONS)),
+    machine_pool=Depends(current_machine_pool),
+):
+    machine_calendar = machine_calendar_for(machine_pool)
+    try:
+        return await cached_response(
+            request,
+            "load_range",
+            (start, end, tuple(machines or ()), resolution),
+            lambda: render_json(
+                machine_calendar.get_load_range(start, end, machines, resolution)
+            ),
+        )
+    except NotEnoughDaysError:
+        raise HTTPException(status_code=422, detail="Invalid range")
+    except (UnknownMachineError, InvalidResolutionError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
 @app.get("/patients", response_model=PagedResponse[PatientModel])
 def get_patient(
     limit: int = 100, patient_gen: PatientGen = Depends(get_patient_generator)
@@ -75,14 +449,8 @@ def get_patient(
     if limit <= 0 or limit > 100:
         raise HTTPException(422, "Invalid limit")
 
-    data = []
-    for _ in range(limit):
-        patient = next(patient_gen.get_patient())
-        patient.assign_random_fraction_time()
-        data.append(patient.to_dict())
-
     return {
-        "items": data,
+        "items": patient_gen.get_batch(limit).to_dicts(),
         "total": 100_000,
     }
 
@@ -100,10 +468,10 @@ def get_cancers(offset: int = 0, limit: int = 100):
 
 
 @app.get("/machines", response_model=PagedResponse)
-def get_machines(
+async def get_machines(
     offset: int = 0,
     limit: int = 100,
-    machine_pool: MachinePool = Depends(get_machine_pool),
+    machine_pool: MachinePool = Depends(current_machine_pool),
 ):
     data = sorted(
         [machine.to_dict() for machine in machine_pool.get_all_machines()],
@@ -116,21 +484,44 @@ def get_machines(
 
 
 @app.get("/report")
-def get_report(
+async def get_report(
+    request: Request,
     start_day: int,
     end_day: int,
-    machine_pool=Depends(get_machine_pool),
+    report_format: str = Query(FORMAT_HTML, alias="format", enum=REPORT_FORMATS),
+    compression: str = Query(COMPRESSION_NONE, enum=REPORT_COMPRESSIONS),
+    machine_pool=Depends(current_machine_pool),
 ):
-    machine_calendar = get_machine_calendar(machine_pool, TWO_YEAR_LEN_DAYS)
-    table = machine_calendar.get_report_data(end_day, start_day)
-
-    return HTMLResponse(
-        table.get_html_string(
-            preserve_internal_border=True,
-            attributes={
-                "border": "1 px",
-                "cellpadding": "15 px",
-                "align": "center",
-            },
+    machine_calendar = machine_calendar_for(machine_pool)
+    if report_format not in REPORT_FORMATS:
+        raise HTTPException(422, detail=str(InvalidReportFormat(report_format)))
+    if compression not in REPORT_COMPRESSIONS:
+        raise HTTPException(422, detail=str(InvalidReportCompression(compression)))
+
+    def render() -> Iterator[bytes]:
+        # the utilization is computed here, the rows are rendered while streaming
+        report = machine_calendar.get_report(end_day, start_day)
+        return (
+            chunk if isinstance(chunk, bytes) else chunk.encode()
+            for chunk in report.render(report_format, compression)
         )
+
+    headers = {}
+    if compression == COMPRESSION_GZIP:
+        headers["Content-Encoding"] = "gzip"
+    return await cached_response(
+        request,
+        "report",
+        (start_day, end_day, report_format, compression),
+        render,
+        media_type=MEDIA_TYPES[report_format],
+        headers=headers,
+        streamed=True,
     )
+
+
+@app.get("/metrics")
+def metrics(machine_pool=Depends(get_machine_pool)):
+    """Prometheus text exposition of the scheduler and calendar metrics."""
+    observe_calendar(machine_calendar_for(machine_pool))
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)